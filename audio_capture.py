@@ -0,0 +1,113 @@
+"""
+Preallocated ring buffer for microphone capture in the Veleron apps
+"""
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size float32 ring buffer for microphone capture
+
+    write() is meant to be called from the PortAudio callback. It copies
+    the block into preallocated memory, down-mixing to mono in place,
+    without allocating. There is a single writer, which publishes the
+    sample count only after copying, so readers need no lock.
+
+    Once more than max_duration seconds have been written, the oldest
+    samples are overwritten and `overflowed` is set.
+    """
+
+    def __init__(self, max_duration: float = 300.0, sample_rate: int = 16000):
+        """
+        Args:
+            max_duration: Maximum number of seconds kept
+            sample_rate: Sample rate of the captured audio in Hz
+        """
+        self.sample_rate = sample_rate
+        self.capacity = int(max_duration * sample_rate)
+        self._buffer = np.zeros(self.capacity, dtype=np.float32)
+        self._written = 0  # samples written since clear(), including overwritten ones
+
+    def clear(self) -> None:
+        """Forget the captured audio, keeping the memory"""
+        self._written = 0
+
+    def write(self, indata: np.ndarray) -> None:
+        """
+        Append a block of float32 samples
+
+        Args:
+            indata: Samples shaped (frames,) or (frames, channels), as passed
+                to a sounddevice callback; channels are averaged into mono
+        """
+        frames = indata.shape[0]
+        written = self._written
+
+        # Only the last `capacity` samples of an oversized block can be kept
+        skip = max(frames - self.capacity, 0)
+        written += skip
+        frames -= skip
+
+        start = written % self.capacity
+        first = min(frames, self.capacity - start)
+        self._mix(indata[skip : skip + first], self._buffer[start : start + first])
+        if first < frames:
+            self._mix(indata[skip + first :], self._buffer[: frames - first])
+
+        self._written = written + frames
+
+    @staticmethod
+    def _mix(indata: np.ndarray, out: np.ndarray) -> None:
+        if indata.ndim == 1:
+            np.copyto(out, indata)
+            return
+
+        # Sum the channels one by one; np.mean would allocate a temporary
+        np.copyto(out, indata[:, 0])
+        for channel in range(1, indata.shape[1]):
+            np.add(out, indata[:, channel], out=out)
+        if indata.shape[1] > 1:
+            out *= 1.0 / indata.shape[1]
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio available"""
+        return len(self) / self.sample_rate
+
+    @property
+    def overflowed(self) -> bool:
+        """Whether samples were overwritten since the last clear()"""
+        return self._written > self.capacity
+
+    def view(self) -> np.ndarray:
+        """
+        Get the captured mono audio, oldest sample first
+
+        Returns:
+            A read-only view of the buffer, without copying, unless the
+            buffer has wrapped around; then the samples are copied in order.
+            The view reflects later writes and clear(), so use copy() for
+            audio that outlives the recording, e.g. when handing it to
+            another thread.
+        """
+        written = self._written
+        if written <= self.capacity:
+            audio = self._buffer[:written].view()
+            audio.flags.writeable = False
+            return audio
+
+        start = written % self.capacity
+        return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def copy(self) -> np.ndarray:
+        """
+        Get a copy of the captured mono audio, oldest sample first
+
+        Returns:
+            A writeable array that does not change when recording restarts
+        """
+        return np.array(self.view(), copy=True)
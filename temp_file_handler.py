@@ -3,6 +3,7 @@ Secure temporary file handling for audio processing
 """
 
 import tempfile
+import math
 import os
 import wave
 import numpy as np
@@ -13,6 +14,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+WHISPER_SAMPLE_RATE = 16000
+
 
 class SecureTempFileHandler:
     """Handle temporary files securely"""
@@ -110,6 +113,47 @@ def write_audio_to_wav(
         wf.writeframes(audio_int16.tobytes())
 
 
+def to_whisper_audio(
+    audio_data: np.ndarray,
+    sample_rate: int = WHISPER_SAMPLE_RATE
+) -> np.ndarray:
+    """
+    Convert recorded audio to the array that whisper's transcribe() accepts
+
+    Passing this array to transcribe() avoids writing a WAV file and
+    decoding it again with ffmpeg. Temp files are only needed for export.
+
+    Args:
+        audio_data: Audio samples (float32, -1.0 to 1.0), shaped (samples,)
+            or (samples, channels)
+        sample_rate: Sample rate of audio_data in Hz
+
+    Returns:
+        Mono float32 samples at 16 kHz
+    """
+    audio = np.asarray(audio_data, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio.reshape(-1)
+
+    if sample_rate != WHISPER_SAMPLE_RATE:
+        try:
+            from scipy.signal import resample_poly
+
+            gcd = math.gcd(WHISPER_SAMPLE_RATE, sample_rate)
+            audio = resample_poly(
+                audio, WHISPER_SAMPLE_RATE // gcd, sample_rate // gcd
+            ).astype(np.float32)
+        except ImportError:
+            # Linear interpolation, when scipy is not installed
+            n_samples = round(len(audio) * WHISPER_SAMPLE_RATE / sample_rate)
+            positions = np.arange(n_samples) * (sample_rate / WHISPER_SAMPLE_RATE)
+            audio = np.interp(
+                positions, np.arange(len(audio)), audio
+            ).astype(np.float32)
+
+    return np.clip(audio, -1.0, 1.0)
+
+
 def secure_delete(file_path: Path) -> None:
     """
     Securely delete a file by overwriting before removal
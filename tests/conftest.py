@@ -27,6 +27,36 @@ def random():
     numpy.random.seed(42)
 
 
+@pytest.fixture
+def tiny_model():
+    """
+    Create a small, randomly initialized Whisper model for testing without checkpoints.
+
+    Returns:
+        Whisper: A 2-layer model with the multilingual vocabulary, in eval mode
+    """
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    torch.manual_seed(0)
+    dims = ModelDimensions(
+        n_mels=80,
+        n_audio_ctx=1500,
+        n_audio_state=64,
+        n_audio_head=4,
+        n_audio_layer=2,
+        n_vocab=51865,
+        n_text_ctx=448,
+        n_text_state=64,
+        n_text_head=4,
+        n_text_layer=2,
+    )
+    model = Whisper(dims).eval()
+    # the decoder's positional embedding is allocated uninitialized
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.01)
+    return model
+
+
 @pytest.fixture
 def mock_whisper_model():
     """
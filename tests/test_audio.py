@@ -1,8 +1,17 @@
 import os.path
 
 import numpy as np
+import torch
 
-from whisper.audio import SAMPLE_RATE, load_audio, log_mel_spectrogram
+from whisper.audio import (
+    N_FRAMES,
+    N_SAMPLES,
+    SAMPLE_RATE,
+    load_audio,
+    log_mel_spectrogram,
+    log_mel_spectrogram_windows,
+    stream_audio,
+)
 
 
 def test_audio():
@@ -17,3 +26,31 @@ def test_audio():
 
     assert np.allclose(mel_from_audio, mel_from_file)
     assert mel_from_audio.max() - mel_from_audio.min() <= 2.0
+
+
+def test_stream_audio():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = load_audio(audio_path)
+
+    blocks = list(stream_audio(audio_path, chunk_length=4))
+    assert all(len(block) == SAMPLE_RATE * 4 for block in blocks[:-1])
+    assert 0 < len(blocks[-1]) <= SAMPLE_RATE * 4
+    assert all(block.dtype == np.float32 for block in blocks)
+    assert np.array_equal(np.concatenate(blocks), audio)
+
+
+def test_log_mel_spectrogram_windows():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    audio = np.tile(load_audio(audio_path), 3)
+    mel = log_mel_spectrogram(audio, padding=N_SAMPLES)
+
+    blocks = [audio[i : i + 12345] for i in range(0, len(audio), 12345)]
+    windows = list(
+        log_mel_spectrogram_windows(blocks, padding=N_SAMPLES, clamp="running")
+    )
+    assert all(window.shape[-1] == N_FRAMES for window in windows[:-1])
+    assert torch.allclose(torch.cat(windows, dim=-1), mel, atol=1e-6)
+
+    windows = list(log_mel_spectrogram_windows(audio_path))
+    assert len(windows) == 1
+    assert torch.allclose(windows[0], log_mel_spectrogram(audio_path), atol=1e-6)
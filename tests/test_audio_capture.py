@@ -0,0 +1,85 @@
+"""
+Unit tests for audio_capture module
+
+Tests the preallocated ring buffer used by the microphone callbacks.
+"""
+
+import numpy as np
+import pytest
+
+from audio_capture import AudioRingBuffer
+
+
+class TestAudioRingBuffer:
+    """Tests for AudioRingBuffer class"""
+
+    def test_write_and_view(self):
+        """Test that blocks are stored back to back as mono samples"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+        chunks = [np.random.randn(30, 1).astype(np.float32) for _ in range(3)]
+
+        for chunk in chunks:
+            buffer.write(chunk)
+
+        assert len(buffer) == 90
+        assert buffer.duration == pytest.approx(0.9)
+        assert not buffer.overflowed
+        assert np.array_equal(buffer.view(), np.concatenate(chunks)[:, 0])
+
+    def test_view_is_read_only_without_copy(self):
+        """Test that an unwrapped buffer is returned without copying"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+        buffer.write(np.ones((10, 1), dtype=np.float32))
+
+        audio = buffer.view()
+
+        assert np.shares_memory(audio, buffer._buffer)
+        with pytest.raises(ValueError):
+            audio[0] = 0.0
+
+    def test_stereo_is_downmixed(self):
+        """Test that channels are averaged into mono"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+
+        buffer.write(np.array([[0.2, 0.4], [-0.5, 0.1]], dtype=np.float32))
+
+        assert np.allclose(buffer.view(), [0.3, -0.2])
+
+    def test_overflow_keeps_latest_audio(self):
+        """Test that the oldest samples are overwritten once full"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+        audio = np.arange(250, dtype=np.float32)
+
+        for start in range(0, 250, 30):
+            buffer.write(audio[start : start + 30])
+
+        assert buffer.overflowed
+        assert len(buffer) == 100
+        assert np.array_equal(buffer.view(), audio[-100:])
+
+        # A block longer than the buffer keeps only its end
+        buffer.write(audio)
+        assert np.array_equal(buffer.view(), audio[-100:])
+
+    def test_clear(self):
+        """Test that clear() empties the buffer and resets the overflow flag"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+        buffer.write(np.zeros(150, dtype=np.float32))
+
+        buffer.clear()
+
+        assert len(buffer) == 0
+        assert not buffer.overflowed
+        assert buffer.view().shape == (0,)
+
+    def test_copy_survives_next_recording(self):
+        """Test that copy() is not overwritten after clear() and new writes"""
+        buffer = AudioRingBuffer(max_duration=1.0, sample_rate=100)
+        buffer.write(np.ones(50, dtype=np.float32))
+
+        audio = buffer.copy()
+        buffer.clear()
+        buffer.write(np.zeros(50, dtype=np.float32))
+
+        assert not np.shares_memory(audio, buffer._buffer)
+        assert np.array_equal(audio, np.ones(50, dtype=np.float32))
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+import torch
+
+import whisper
+
+
+@pytest.mark.parametrize("model_name", ["tiny", "tiny.en"])
+def test_batch_transcription(model_name: str):
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = whisper.load_model(model_name).to(device)
+    audio = whisper.load_audio(os.path.join(os.path.dirname(__file__), "jfk.flac"))
+    audio = audio.repeat(4)  # long enough for several 30-second windows
+
+    language = "en" if model_name.endswith(".en") else None
+    result = model.transcribe(
+        audio,
+        language=language,
+        temperature=0.0,
+        condition_on_previous_text=False,
+        batch_size=4,
+    )
+    assert result["language"] == "en"
+    assert result["text"] == "".join([s["text"] for s in result["segments"]])
+
+    starts = [s["start"] for s in result["segments"]]
+    assert starts == sorted(starts)
+    assert result["text"].lower().count("your country") >= 3
@@ -0,0 +1,188 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from whisper.decoding import (
+    ApplyTimestampRules,
+    BeamSearchDecoder,
+    Inference,
+    SuppressTokens,
+    get_suppress_tokens,
+)
+from whisper.tokenizer import get_tokenizer
+
+
+class RecordingInference(Inference):
+    def __init__(self):
+        self.source_indices = []
+
+    def rearrange_kv_cache(self, source_indices):
+        self.source_indices.append(source_indices.tolist())
+
+
+def test_beam_search_update():
+    eot = 3
+    inference = RecordingInference()
+    decoder = BeamSearchDecoder(beam_size=2, eot=eot, inference=inference)
+
+    # the beams of each audio start out identical, so only one of them proposes candidates
+    tokens = torch.tensor([[7], [7], [8], [8]])
+    logits = torch.tensor(
+        [[0.0, 4.0, 3.0, 5.0, -9.0]] * 2 + [[6.0, 0.0, 1.0, -9.0, 2.0]] * 2
+    )
+    sum_logprobs = torch.zeros(4)
+    tokens, completed = decoder.update(tokens, logits, sum_logprobs)
+
+    assert tokens.tolist() == [[7, 1], [7, 2], [8, 0], [8, 4]]
+    assert inference.source_indices == [[0, 0, 2, 2]]
+    assert list(decoder.finished_sequences[0]) == [(7, eot)]
+    assert decoder.finished_sequences[1] == {}
+    assert not completed
+
+    logprobs = torch.log_softmax(logits, dim=-1)
+    assert torch.allclose(sum_logprobs[:2], logprobs[0, [1, 2]])
+    assert torch.allclose(sum_logprobs[2:], logprobs[2, [0, 4]])
+
+
+def beam_search_update_reference(decoder, tokens, logits, sum_logprobs):
+    """The previous BeamSearchDecoder.update, which ranks the candidates in Python dicts"""
+    beam_size, eot = decoder.beam_size, decoder.eot
+    n_audio = tokens.shape[0] // beam_size
+    if decoder.finished_sequences is None:  # for the first update
+        decoder.finished_sequences = [{} for _ in range(n_audio)]
+
+    logprobs = F.log_softmax(logits.float(), dim=-1)
+    next_tokens, source_indices, finished_sequences = [], [], []
+    for i in range(n_audio):
+        scores, sources, finished = {}, {}, {}
+        for j in range(beam_size):
+            idx = i * beam_size + j
+            prefix = tokens[idx].tolist()
+            for logprob, token in zip(*logprobs[idx].topk(beam_size + 1)):
+                new_logprob = (sum_logprobs[idx] + logprob).item()
+                sequence = tuple(prefix + [token.item()])
+                scores[sequence] = new_logprob
+                sources[sequence] = idx
+
+        saved = 0
+        for sequence in sorted(scores, key=scores.get, reverse=True):
+            if sequence[-1] == eot:
+                finished[sequence] = scores[sequence]
+            else:
+                sum_logprobs[len(next_tokens)] = scores[sequence]
+                next_tokens.append(sequence)
+                source_indices.append(sources[sequence])
+
+                saved += 1
+                if saved == beam_size:
+                    break
+
+        finished_sequences.append(finished)
+
+    tokens = torch.tensor(next_tokens, device=tokens.device)
+    decoder.inference.source_indices.append(source_indices)
+
+    for previously_finished, newly_finished in zip(
+        decoder.finished_sequences, finished_sequences
+    ):
+        for seq in sorted(newly_finished, key=newly_finished.get, reverse=True):
+            if len(previously_finished) >= decoder.max_candidates:
+                break  # the candidate list is full
+            previously_finished[seq] = newly_finished[seq]
+
+    completed = all(
+        len(sequences) >= decoder.max_candidates
+        for sequences in decoder.finished_sequences
+    )
+    return tokens, completed
+
+
+def test_beam_search_update_equivalence():
+    generator = torch.Generator().manual_seed(0)
+    eot, n_vocab = 3, 12
+
+    for _ in range(300):
+        beam_size, n_audio, patience = [
+            [1, 2, 3, 5][torch.randint(4, (1,), generator=generator)],
+            int(torch.randint(1, 4, (1,), generator=generator)),
+            [None, 1.5, 2.0][torch.randint(3, (1,), generator=generator)],
+        ]
+        decoders = [
+            BeamSearchDecoder(beam_size, eot, RecordingInference(), patience)
+            for _ in range(2)
+        ]
+        # the beams of each audio start out identical, as in DecodingTask
+        prefix = torch.randint(4, n_vocab, (n_audio, 1), generator=generator)
+        tokens = [prefix.repeat_interleave(beam_size, dim=0)] * 2
+        sum_logprobs = [torch.zeros(n_audio * beam_size) for _ in range(2)]
+
+        for _ in range(int(torch.randint(1, 6, (1,), generator=generator))):
+            # small integer logits produce ties; -inf stands for suppressed tokens
+            logits = torch.randint(
+                -3, 3, (n_audio * beam_size, n_vocab), generator=generator
+            )
+            logits = logits.float().masked_fill(
+                torch.rand(logits.shape, generator=generator) < 0.2, -np.inf
+            )
+            logits[:, eot] += 2 * torch.rand(len(logits), generator=generator)
+            # identical beams, as at the first step, have identical logits
+            same = (tokens[0][:, None] == tokens[0][None]).all(dim=-1)
+            logits = logits[same.int().argmax(dim=0)]
+
+            expected = beam_search_update_reference(
+                decoders[0], tokens[0], logits, sum_logprobs[0]
+            )
+            actual = decoders[1].update(tokens[1], logits, sum_logprobs[1])
+            assert actual[0].tolist() == expected[0].tolist()
+            assert actual[1] == expected[1]
+            assert torch.equal(sum_logprobs[1], sum_logprobs[0])
+            # identical beams have identical KV caches, so either can be the source
+            sources = [decoder.inference.source_indices[-1] for decoder in decoders]
+            assert torch.equal(tokens[0][sources[1]], tokens[0][sources[0]])
+            tokens = [expected[0], actual[0]]
+
+        for actual, expected in zip(
+            decoders[1].finished_sequences, decoders[0].finished_sequences
+        ):
+            assert list(actual.items()) == list(expected.items())
+
+
+def test_apply_timestamp_rules():
+    tokenizer = get_tokenizer(multilingual=True)
+    timestamp_begin, eot = tokenizer.timestamp_begin, tokenizer.eot
+    sample_begin = 2
+    sequences = [
+        [timestamp_begin + 5, 100],  # text after a timestamp
+        [timestamp_begin + 5, timestamp_begin + 7],  # a pair of timestamps
+        [100, timestamp_begin + 7],  # a single timestamp
+    ]
+    tokens = torch.tensor([[1, 2] + sequence for sequence in sequences])
+    logits = torch.zeros(3, tokenizer.encoding.n_vocab)
+    logits[:, 100] = 10.0  # make text more likely than timestamps
+
+    ApplyTimestampRules(tokenizer, sample_begin, None).apply(logits, tokens)
+    allowed = logits.isfinite()
+
+    assert allowed[0, 100] and allowed[0, eot]
+    assert not allowed[0, timestamp_begin : timestamp_begin + 6].any()
+    assert allowed[0, timestamp_begin + 6 :].all()
+
+    assert allowed[1, 100] and allowed[1, eot]
+    assert not allowed[1, timestamp_begin:].any()
+
+    assert not allowed[2, :eot].any()
+    assert not allowed[2, timestamp_begin : timestamp_begin + 7].any()
+    assert allowed[2, timestamp_begin + 7 :].all()
+
+
+def test_suppress_tokens():
+    tokenizer = get_tokenizer(multilingual=True)
+    suppress_tokens = get_suppress_tokens(True, 99, "-1")
+    assert suppress_tokens is get_suppress_tokens(True, 99, "-1")
+    assert set(tokenizer.non_speech_tokens) <= set(suppress_tokens)
+    assert tokenizer.sot in suppress_tokens and tokenizer.no_speech in suppress_tokens
+    assert get_suppress_tokens(True, 99, ()) == get_suppress_tokens(True, 99, None)
+
+    logits = torch.zeros(2, tokenizer.encoding.n_vocab)
+    SuppressTokens(suppress_tokens).apply(logits, torch.zeros(2, 3, dtype=torch.long))
+    assert logits.isinf().nonzero()[:, 1].unique().tolist() == list(suppress_tokens)
@@ -0,0 +1,33 @@
+import hashlib
+import os
+from unittest.mock import patch
+
+import pytest
+
+import whisper
+from whisper import _download
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_download(tmp_path, in_memory):
+    data = os.urandom(100_000)
+    sha256 = hashlib.sha256(data).hexdigest()
+    source = tmp_path / "source" / sha256 / "model.pt"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(data)
+    url = source.as_uri()
+    root = str(tmp_path / "cache")
+
+    expected = data if in_memory else os.path.join(root, "model.pt")
+    assert _download(url, root, in_memory) == expected
+    assert os.path.isfile(os.path.join(root, "model.pt.verified"))
+
+    # a verified file is not hashed again
+    with patch.object(whisper, "_sha256", side_effect=AssertionError):
+        assert _download(url, root, in_memory) == expected
+
+    # a modified file is hashed and downloaded again
+    with open(os.path.join(root, "model.pt"), "ab") as f:
+        f.write(b"\0")
+    with pytest.warns(UserWarning, match="re-downloading"):
+        assert _download(url, root, in_memory) == expected
@@ -191,7 +191,8 @@ class TestVeleronDictationIntegration:
         assert dictation.is_recording is True
 
         # Add audio data
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
 
         # Stop and transcribe
         dictation.stop_recording()
@@ -259,7 +260,8 @@ class TestVeleronVoiceFlowIntegration:
         app.model = mock_model
 
         # Step 1: Record
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
 
         # Step 2: Transcribe
         app.transcribe_recording()
@@ -331,11 +333,14 @@ class TestVeleronVoiceFlowIntegration:
         app.model = mock_model
 
         # First recording
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
         app.transcribe_recording()
 
         # Second recording
-        app.audio_data = sample_audio_chunks
+        app.audio_buffer.clear()
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
         app.transcribe_recording()
 
         # Verify both were processed
@@ -527,14 +532,17 @@ class TestErrorRecoveryWorkflows:
         app.model = mock_model
 
         # First attempt - should fail gracefully
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
         app.transcribe_recording()
 
         # Error should be shown
         mock_error.assert_called_once()
 
         # Second attempt - should succeed
-        app.audio_data = sample_audio_chunks
+        app.audio_buffer.clear()
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
         app.transcribe_recording()
 
         # Should complete without crashing
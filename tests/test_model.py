@@ -0,0 +1,200 @@
+import copy
+import threading
+from dataclasses import asdict, replace
+
+import pytest
+import torch
+
+import whisper
+from whisper.decoding import (
+    DecodingOptions,
+    DecodingSession,
+    decode_speculative,
+    decode_temperatures,
+)
+from whisper.model import (
+    AudioFeaturesCache,
+    Linear,
+    Whisper,
+    capture_attention,
+    disable_sdpa,
+)
+
+
+@pytest.mark.parametrize("max_length", [None, 16])
+def test_kv_cache(tiny_model, max_length):
+    audio_features = tiny_model.embed_audio(torch.randn(2, 80, 3000))
+    tokens = torch.randint(0, 50000, (2, 10))
+    expected = tiny_model.logits(tokens, audio_features)
+
+    kv_cache, hooks = tiny_model.install_kv_cache_hooks(max_length=max_length)
+    with torch.no_grad():
+        logits = [tiny_model.decoder(tokens[:, :4], audio_features, kv_cache=kv_cache)]
+        for i in range(4, tokens.shape[1]):
+            logits.append(
+                tiny_model.decoder(
+                    tokens[:, i : i + 1], audio_features, kv_cache=kv_cache
+                )
+            )
+    for hook in hooks:
+        hook.remove()
+
+    assert torch.allclose(torch.cat(logits, dim=1), expected, atol=1e-4)
+
+
+def test_audio_features_cache(tiny_model):
+    calls = []
+    tiny_model.encoder.register_forward_hook(
+        lambda _, inputs, __: calls.append(inputs[0])
+    )
+    tiny_model.audio_features_cache = AudioFeaturesCache(maxsize=2)
+    mel = torch.randn(3, 80, 3000)
+
+    with torch.no_grad():
+        expected = tiny_model.encoder(mel)
+        calls.clear()
+        assert torch.allclose(tiny_model.embed_audio(mel[:2]), expected[:2])
+        assert torch.allclose(tiny_model.embed_audio(mel[1:]), expected[1:])
+
+    # only the third window had to be encoded on the second call
+    assert [c.shape[0] for c in calls] == [2, 1]
+    assert len(tiny_model.audio_features_cache) == 2
+
+
+def test_capture_attention(tiny_model):
+    audio_features = tiny_model.embed_audio(torch.randn(1, 80, 3000))
+    tokens = torch.randint(0, 50000, (1, 10))
+    cross_attn = tiny_model.decoder.blocks[1].cross_attn
+    self_attn = tiny_model.decoder.blocks[0].attn
+    heads = {cross_attn: torch.tensor([1, 3]), self_attn: torch.tensor([0])}
+
+    with torch.no_grad():
+        qks = {}
+        hooks = [
+            module.register_forward_hook(
+                lambda m, _, outputs: qks.__setitem__(m, outputs[-1])
+            )
+            for module in heads
+        ]
+        with disable_sdpa():
+            expected = tiny_model.logits(tokens, audio_features)
+        for hook in hooks:
+            hook.remove()
+
+        # another thread decoding at the same time is not affected
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(tiny_model.logits(tokens, audio_features))
+        )
+        with capture_attention(heads) as weights:
+            thread.start()
+            thread.join()
+            assert len(weights) == 0
+            logits = tiny_model.logits(tokens, audio_features)
+
+    assert torch.allclose(logits, expected, atol=1e-4)
+    assert torch.allclose(other[0], expected, atol=1e-4)
+    assert set(weights) == set(heads)
+    for module, indices in heads.items():
+        assert weights[module].shape == (1, len(indices), 10, qks[module].shape[-1])
+        assert torch.allclose(weights[module], qks[module][:, indices], atol=1e-4)
+
+
+def test_decode_temperatures(tiny_model):
+    mel = torch.randn(2, 80, 3000)
+    options = DecodingOptions(language="en", sample_len=8, fp16=False)
+    expected = tiny_model.decode(mel, options)
+
+    results = decode_temperatures(tiny_model, mel, [0.0, 0.5, 1.0], options)
+    assert [len(r) for r in results] == [3, 3]
+    for greedy, candidates in zip(expected, results):
+        assert candidates[0].tokens == greedy.tokens
+        assert [c.temperature for c in candidates] == [0.0, 0.5, 1.0]
+
+
+@pytest.mark.parametrize("beam_size", [None, 3])
+def test_decoding_session(tiny_model, beam_size):
+    mel = torch.randn(2, 80, 3000)
+    options = DecodingOptions(
+        language="en", sample_len=8, beam_size=beam_size, fp16=False
+    )
+
+    with DecodingSession(tiny_model, options) as session:
+        for prompt in [None, [220, 257], [220, 257], [464, 1049, 286], None]:
+            expected = tiny_model.decode(mel, options, prompt=prompt)
+            results = session.decode(mel, prompt)
+            assert [r.tokens for r in results] == [r.tokens for r in expected]
+
+    assert all(not module._forward_hooks for module in tiny_model.modules())
+
+
+def test_transcribe_closes_sessions_on_error(tiny_model):
+    calls = []
+
+    def fail_second_step(module, inputs, output):
+        calls.append(None)
+        if len(calls) == 2:
+            raise RuntimeError("decoding failed")
+
+    hook = tiny_model.decoder.ln.register_forward_hook(fail_second_step)
+    audio = torch.randn(16000 * 5) * 0.1
+    for _ in range(3):
+        calls.clear()
+        with pytest.raises(RuntimeError, match="decoding failed"):
+            tiny_model.transcribe(audio, language="en", fp16=False, temperature=0.0)
+        assert all(not m._forward_hooks for m in tiny_model.decoder.blocks.modules())
+    hook.remove()
+
+
+def test_decode_speculative(tiny_model):
+    mel = torch.randn(2, 80, 3000)
+    options = DecodingOptions(language="en", sample_len=12, fp16=False)
+    expected = tiny_model.decode(mel, options)
+
+    # an identical draft model has all of its proposals accepted, and an unrelated one almost none
+    smaller = Whisper(replace(tiny_model.dims, n_text_layer=1)).eval()
+    torch.nn.init.normal_(smaller.decoder.positional_embedding, std=0.01)
+    for draft_model in [copy.deepcopy(tiny_model), smaller]:
+        for num_draft_tokens in [1, 4]:
+            results = decode_speculative(
+                tiny_model, draft_model, mel, options, num_draft_tokens
+            )
+            assert [r.tokens for r in results] == [r.tokens for r in expected]
+            for result, greedy in zip(results, expected):
+                assert result.avg_logprob == pytest.approx(greedy.avg_logprob, abs=1e-5)
+
+    with pytest.raises(ValueError):
+        decode_speculative(tiny_model, smaller, mel, options, temperature=0.5)
+
+
+def test_load_model(tiny_model, tmp_path):
+    checkpoint_path = str(tmp_path / "model.pt")
+    state_dict = {k: v.half() for k, v in tiny_model.state_dict().items()}
+    torch.save(
+        {"dims": asdict(tiny_model.dims), "model_state_dict": state_dict},
+        checkpoint_path,
+    )
+
+    expected = whisper.load_model(checkpoint_path, device="cpu", in_memory=True)
+    loaded = whisper.load_model(checkpoint_path, device="cpu")
+
+    assert loaded.state_dict().keys() == expected.state_dict().keys()
+    for name, tensor in loaded.state_dict().items():
+        assert tensor.dtype == expected.state_dict()[name].dtype
+        assert torch.equal(tensor, expected.state_dict()[name])
+    assert torch.equal(
+        loaded.alignment_heads.to_dense(), tiny_model.alignment_heads.to_dense()
+    )
+
+
+def test_quantize(tiny_model):
+    mel = torch.randn(1, 80, 3000)
+    tokens = torch.randint(0, 50000, (1, 10))
+    with torch.no_grad():
+        expected = tiny_model(mel, tokens)
+        logits = tiny_model.quantize("int8")(mel, tokens)
+
+    assert not any(isinstance(m, Linear) for m in tiny_model.modules())
+    assert logits.dtype == expected.dtype
+    assert torch.allclose(logits, expected, atol=0.05 * expected.abs().max())
+    assert (logits.argmax(-1) == expected.argmax(-1)).float().mean() > 0.9
@@ -0,0 +1,33 @@
+import os
+import time
+
+import pytest
+
+import whisper
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("model_name", ["tiny", "base"])
+def test_quantized_transcription(model_name: str):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    options = dict(language="en", temperature=0.0, fp16=False)
+
+    results, timings = {}, {}
+    for quantize in [None, "int8"]:
+        model = whisper.load_model(model_name, device="cpu", quantize=quantize)
+        model.transcribe(audio_path, **options)  # warm-up
+        start = time.perf_counter()
+        results[quantize] = model.transcribe(audio_path, **options)
+        timings[quantize] = time.perf_counter() - start
+
+    print(f"{model_name}: fp32 {timings[None]:.2f}s, int8 {timings['int8']:.2f}s")
+
+    transcription = results["int8"]["text"].lower()
+    assert "my fellow americans" in transcription
+    assert "your country" in transcription
+    assert "do for you" in transcription
+
+    # close to the fp32 transcription, word for word
+    expected = results[None]["text"].lower().split()
+    words = transcription.split()
+    assert sum(a == b for a, b in zip(expected, words)) >= 0.9 * len(expected)
@@ -0,0 +1,82 @@
+import os
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+import whisper
+import whisper.server
+from whisper.server import TranscriptionServer, UnixHTTPServer, request_transcription
+
+
+def fake_transcribe(model, audio, segment_callback=None, **options):
+    segments = [{"id": 0, "start": 0.0, "end": 1.0, "text": " Hello"}]
+    segment_callback(segments)
+    return {"text": " Hello", "segments": segments, "language": options["language"]}
+
+
+@pytest.mark.parametrize("audio", ["jfk.flac", "missing.flac"])
+def test_server(monkeypatch, tmp_path, audio):
+    monkeypatch.setattr(whisper, "load_model", Mock(return_value=Mock()))
+    monkeypatch.setattr(whisper.server, "transcribe", fake_transcribe)
+
+    transcription_server = TranscriptionServer("tiny")
+    server = UnixHTTPServer(str(tmp_path / "whisper.sock"), transcription_server)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    audio_path = os.path.join(os.path.dirname(__file__), audio)
+    messages = request_transcription(server.server_address, audio_path, language="en")
+    try:
+        if audio == "missing.flac":
+            with pytest.raises(RuntimeError, match="Failed to load audio"):
+                list(messages)
+        else:
+            segments, result = list(messages)
+            assert segments["segments"][0]["text"] == " Hello"
+            assert result["result"]["language"] == "en"
+    finally:
+        server.shutdown()
+        server.server_close()
+        transcription_server.close()
+
+    whisper.load_model.assert_called_once()
+
+
+def test_server_worker_survives_errors(monkeypatch, tiny_model):
+    def fail_batched_encode(module, inputs):
+        if inputs[0].shape[0] > 1:
+            raise RuntimeError("CUDA out of memory")
+
+    tiny_model.encoder.register_forward_pre_hook(fail_batched_encode)
+    monkeypatch.setattr(whisper, "load_model", Mock(return_value=tiny_model))
+
+    # run the worker loop on this thread, so that the jobs are batched deterministically
+    transcription_server = TranscriptionServer("tiny", max_batch_size=3)
+    transcription_server.close()
+
+    audio = whisper.load_audio(os.path.join(os.path.dirname(__file__), "jfk.flac"))
+    options = dict(language="en", fp16=False, temperature=0.0, sample_len=4)
+    batched = [transcription_server.submit(audio, **options) for _ in range(2)]
+    unhashable = transcription_server.submit(audio, **{**options, "fp16": [False]})
+    single = transcription_server.submit(audio, **options)
+    transcription_server.jobs.put(None)
+    transcription_server._run()
+
+    for job in batched:
+        assert "CUDA out of memory" in list(job)[-1]["error"]
+    assert "TypeError" in list(unhashable)[-1]["error"]
+    assert "result" in list(single)[-1]
+
+
+def test_unix_server_keeps_other_files(tmp_path):
+    path = tmp_path / "whisper.sock"
+    path.write_text("not a socket")
+    with pytest.raises(FileExistsError):
+        UnixHTTPServer(str(path), Mock())
+    assert path.read_text() == "not a socket"
+
+    # a stale socket is replaced
+    path.unlink()
+    UnixHTTPServer(str(path), Mock()).server_close()
+    server = UnixHTTPServer(str(path), Mock())
+    server.server_close()
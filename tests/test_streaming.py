@@ -0,0 +1,105 @@
+import os.path
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from whisper.audio import N_FFT, SAMPLE_RATE, _log_mel_frames, load_audio
+from whisper.streaming import StreamingTranscriber
+from whisper.tokenizer import get_tokenizer
+
+
+class ScriptedTranscriber(StreamingTranscriber):
+    """Returns prepared (segments, number of complete segments) instead of decoding"""
+
+    def __init__(self, model, hypotheses, **kwargs):
+        super().__init__(model, language="en", **kwargs)
+        self.tokenizer = get_tokenizer(multilingual=False)
+        self.hypotheses = iter(hypotheses)
+
+    def _decode(self):
+        segments, complete = next(self.hypotheses)
+        start = self.buffer_start
+        return [(start + s, start + e, tokens) for s, e, tokens in segments], complete
+
+
+def test_local_agreement(tiny_model):
+    hypotheses = [
+        ([(0.0, 1.0, [1, 2])], 0),
+        ([(0.0, 1.0, [1, 2, 3])], 1),
+        ([(0.0, 1.2, [1, 2, 3]), (1.2, 2.0, [4])], 1),
+        ([(0.0, 0.8, [5])], 0),
+        ([(0.0, 1.0, [5, 6])], 1),
+    ]
+    partials, finals = [], []
+    transcriber = ScriptedTranscriber(
+        tiny_model, hypotheses, on_partial=partials.append, on_final=finals.append
+    )
+
+    transcriber.insert_audio(np.zeros(SAMPLE_RATE * 2, dtype=np.float32))
+    assert finals == []  # [1, 2, 3] was seen once, differing from [1, 2]
+    assert [p["tokens"] for p in partials] == [[1, 2], [1, 2, 3]]
+
+    transcriber.insert_audio(np.zeros(SAMPLE_RATE, dtype=np.float32))
+    assert [segment["tokens"] for segment in finals] == [[1, 2, 3]]
+    assert finals[0]["start"] == 0.0 and finals[0]["end"] == 1.2
+    assert transcriber.buffer_start == 1.2
+    assert partials[-1]["tokens"] == [4]
+
+    transcriber.insert_audio(np.zeros(SAMPLE_RATE, dtype=np.float32))
+    assert len(finals) == 1  # [5] is not complete yet
+
+    result = transcriber.finish()
+    assert [s["tokens"] for s in result["segments"]] == [[1, 2, 3], [5, 6]]
+    assert result["segments"][1]["start"] == 1.2
+    assert result["segments"] == finals
+
+
+def test_streaming_transcriber(tiny_model):
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    pcm = (load_audio(audio_path) * 32767).astype(np.int16)
+    partials, finals = [], []
+    transcriber = StreamingTranscriber(
+        tiny_model,
+        on_partial=partials.append,
+        on_final=finals.append,
+        language="en",
+        sample_len=8,
+    )
+
+    for i in range(0, len(pcm), 1600):
+        transcriber.insert_audio(pcm[i : i + 1600])
+
+    # the rolling buffer holds the same log-Mel frames as a one-shot computation
+    audio = torch.from_numpy(pcm.astype(np.float32) / 32768.0)
+    expected = _log_mel_frames(F.pad(audio, (N_FFT // 2, 0)), 80)
+    buffered = torch.cat(transcriber.frames, dim=-1)
+    start = transcriber.buffer_frame
+    assert torch.allclose(buffered, expected[:, start : start + buffered.shape[-1]])
+
+    result = transcriber.finish()
+    assert len(partials) == len(pcm) // SAMPLE_RATE
+    assert result["segments"] == finals
+    assert all(s["start"] <= s["end"] for s in result["segments"])
+    assert transcriber.session is None
+
+
+def test_streaming_transcriber_close(tiny_model):
+    def has_hooks():
+        return any(module._forward_hooks for module in tiny_model.modules())
+
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    with StreamingTranscriber(tiny_model, language="en", sample_len=4) as transcriber:
+        transcriber.insert_audio(silence)
+        assert transcriber.session is not None and has_hooks()
+    assert transcriber.session is None and not has_hooks()
+
+    # a failed decoding does not leave the session's hooks on the model
+    transcriber = StreamingTranscriber(tiny_model, language="en", sample_len=4)
+    transcriber.insert_audio(silence)
+    transcriber.session.decode = Mock(side_effect=RuntimeError("decoding failed"))
+    with pytest.raises(RuntimeError, match="decoding failed"):
+        transcriber.insert_audio(silence)
+    assert transcriber.session is None and not has_hooks()
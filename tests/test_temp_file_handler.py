@@ -17,7 +17,8 @@ from temp_file_handler import (
     SecureTempFileHandler,
     write_audio_to_wav,
     secure_delete,
-    temp_audio_file
+    temp_audio_file,
+    to_whisper_audio
 )
 
 
@@ -260,6 +261,49 @@ class TestWriteAudioToWav:
             np.testing.assert_array_almost_equal(audio_float, audio_data, decimal=4)
 
 
+class TestToWhisperAudio:
+    """Tests for to_whisper_audio function"""
+
+    def test_mono_16khz_is_passed_through(self):
+        """Test that 16kHz chunks only lose their channel dimension"""
+        audio_data = (np.random.randn(16000, 1) * 0.1).astype(np.float32)
+
+        audio = to_whisper_audio(audio_data, sample_rate=16000)
+
+        assert audio.shape == (16000,)
+        assert audio.dtype == np.float32
+        assert np.array_equal(audio, audio_data[:, 0])
+
+    def test_stereo_is_downmixed(self):
+        """Test that channels are averaged into mono"""
+        audio_data = np.array([[0.2, 0.4], [-0.5, 0.1]], dtype=np.float32)
+
+        audio = to_whisper_audio(audio_data)
+
+        assert np.allclose(audio, [0.3, -0.2])
+
+    def test_resampling_to_16khz(self):
+        """Test that other sample rates are resampled to 16kHz"""
+        sample_rate = 48000
+        t = np.arange(sample_rate) / sample_rate
+        audio_data = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+        audio = to_whisper_audio(audio_data, sample_rate=sample_rate)
+
+        assert audio.shape == (16000,)
+        assert audio.dtype == np.float32
+        expected = 0.5 * np.sin(2 * np.pi * 440 * np.arange(16000) / 16000)
+        assert np.abs(audio[100:-100] - expected[100:-100]).max() < 0.01
+
+    def test_values_are_clipped(self):
+        """Test that overdriven samples are clipped to [-1, 1]"""
+        audio_data = np.array([1.5, -2.0, 0.25], dtype=np.float32)
+
+        audio = to_whisper_audio(audio_data)
+
+        assert np.array_equal(audio, np.array([1.0, -1.0, 0.25], dtype=np.float32))
+
+
 class TestSecureDelete:
     """Tests for secure_delete function"""
 
@@ -1,9 +1,21 @@
+import os.path
+
 import numpy as np
 import pytest
 import scipy.ndimage
 import torch
 
-from whisper.timing import dtw_cpu, dtw_cuda, median_filter
+from whisper.audio import N_FRAMES, log_mel_spectrogram, pad_or_trim
+from whisper.timing import (
+    dtw_batch,
+    dtw_cpu,
+    dtw_cpu_wavefront,
+    dtw_cuda,
+    find_alignment,
+    median_filter,
+    warm_up,
+)
+from whisper.tokenizer import get_tokenizer
 
 sizes = [
     (10, 20),
@@ -52,6 +64,26 @@ def test_dtw(N: int, M: int):
     assert np.allclose(trace, dtw_trace)
 
 
+@pytest.mark.parametrize("N, M", sizes)
+def test_dtw_wavefront_equivalence(N: int, M: int):
+    x = np.random.randn(N, M)
+    assert np.array_equal(dtw_cpu_wavefront(x), dtw_cpu(x))
+
+
+def test_warm_up():
+    warm_up()
+    assert len(dtw_cpu.signatures) > 0
+
+
+def test_dtw_batch():
+    xs = [torch.randn(N, M) for N, M in sizes]
+    paths = dtw_batch(xs)
+
+    assert len(paths) == len(xs)
+    for x, path in zip(xs, paths):
+        assert np.array_equal(path, dtw_cpu(x.double().numpy()))
+
+
 @pytest.mark.requires_cuda
 @pytest.mark.parametrize("N, M", sizes)
 def test_dtw_cuda_equivalence(N: int, M: int):
@@ -94,3 +126,28 @@ def test_median_filter_equivalence(shape):
         filtered_gpu = median_filter(x.cuda(), filter_width).cpu()
 
         assert np.allclose(filtered_cpu, filtered_gpu)
+
+
+def test_find_alignment_with_audio_features(tiny_model):
+    model = tiny_model
+    model.alignment_heads = torch.tensor(
+        [[False, True, False, False], [True] * 4]
+    ).to_sparse()
+
+    tokenizer = get_tokenizer(True, language="en", task="transcribe")
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    mel = pad_or_trim(log_mel_spectrogram(audio_path), N_FRAMES)
+    text_tokens = tokenizer.encode(" And so my fellow Americans, ask not")
+
+    expected = find_alignment(model, tokenizer, text_tokens, mel, 1100)
+    audio_features = model.embed_audio(mel.unsqueeze(0))[0]
+    alignment = find_alignment(
+        model, tokenizer, text_tokens, mel, 1100, audio_features=audio_features
+    )
+
+    assert len(alignment) == len(expected) > 0
+    for timing, expected_timing in zip(alignment, expected):
+        assert timing.word == expected_timing.word
+        assert timing.start == expected_timing.start
+        assert timing.end == expected_timing.end
+        assert timing.probability == pytest.approx(expected_timing.probability)
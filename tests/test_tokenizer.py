@@ -1,3 +1,5 @@
+import time
+
 import pytest
 
 from whisper.tokenizer import get_tokenizer
@@ -32,3 +34,63 @@ def test_split_on_unicode():
 
     assert words == [" elle", " est", " l", "'", "\ufffd", "é", "rit", "oire"]
     assert word_tokens == [[8404], [871], [287], [6], [246], [526], [3210], [20378]]
+
+
+def split_tokens_on_unicode_reference(tokenizer, tokens):
+    """The previous implementation, which decodes a growing list of tokens with tiktoken"""
+    decoded_full = tokenizer.decode_with_timestamps(tokens)
+    words, word_tokens, current_tokens, unicode_offset = [], [], [], 0
+    for token in tokens:
+        current_tokens.append(token)
+        decoded = tokenizer.decode_with_timestamps(current_tokens)
+        if (
+            "\ufffd" not in decoded
+            or decoded_full[unicode_offset + decoded.index("\ufffd")] == "\ufffd"
+        ):
+            words.append(decoded)
+            word_tokens.append(current_tokens)
+            current_tokens = []
+            unicode_offset += len(decoded)
+    return words, word_tokens
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "我们今天去公园散步，天气非常好。",
+        "東京は日本の首都です。",
+        "สวัสดีครับ ยินดีต้อนรับ",
+        "Mixed 中文 and émojis 🎉🎈!",
+    ],
+)
+def test_split_on_unicode_equivalence(text):
+    tokenizer = get_tokenizer(multilingual=True, language="zh")
+    tokens = tokenizer.encode(text)
+    # timestamps, a truncated multi-byte character and a reordered sequence
+    variants = [
+        tokens,
+        [tokenizer.timestamp_begin, *tokens, tokenizer.timestamp_begin + 50],
+        tokens[1:],
+        tokens[::-1],
+    ]
+    for variant in variants:
+        expected = split_tokens_on_unicode_reference(tokenizer, variant)
+        assert tokenizer.split_tokens_on_unicode(variant) == expected
+        assert tokenizer.split_to_word_tokens(variant) == expected
+
+
+@pytest.mark.slow
+def test_split_on_unicode_benchmark():
+    tokenizer = get_tokenizer(multilingual=True, language="ja")
+    tokens = tokenizer.encode("東京は日本の首都で、人口が最も多い都市です。" * 20)
+
+    def measure(function):
+        start = time.perf_counter()
+        for _ in range(10):
+            function(tokens)
+        return (time.perf_counter() - start) / 10
+
+    reference = measure(lambda t: split_tokens_on_unicode_reference(tokenizer, t))
+    elapsed = measure(tokenizer.split_tokens_on_unicode)
+    print(f"{len(tokens)} tokens: {reference * 1e3:.2f}ms -> {elapsed * 1e3:.2f}ms")
+    assert elapsed < reference
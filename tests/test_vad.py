@@ -0,0 +1,31 @@
+import os.path
+
+import numpy as np
+
+from whisper.audio import SAMPLE_RATE, load_audio
+from whisper.vad import frame_energy, speech_regions
+
+
+def test_frame_energy():
+    audio = np.full(SAMPLE_RATE + 80, 0.5, dtype=np.float32)
+    energy = frame_energy(audio)
+    assert energy.shape == (101,)
+    assert np.allclose(energy[:-1], 10 * np.log10(0.25), atol=1e-4)
+    assert energy[-1] < energy[0]
+
+
+def test_speech_regions():
+    audio_path = os.path.join(os.path.dirname(__file__), "jfk.flac")
+    speech = load_audio(audio_path)
+    silence = np.zeros(SAMPLE_RATE * 20, dtype=np.float32)
+    audio = np.concatenate([silence, speech, silence, speech, silence[:SAMPLE_RATE]])
+    audio += np.random.default_rng(0).normal(0, 0.003, len(audio)).astype(np.float32)
+
+    regions = speech_regions(audio)
+    assert len(regions) == 2
+    for (start, end), offset in zip(regions, [20, 51]):
+        assert offset - 0.5 < start < offset + 1
+        assert offset + 10 < end < offset + 12
+
+    assert speech_regions(silence) == []
+    assert speech_regions(np.zeros(0, dtype=np.float32)) == []
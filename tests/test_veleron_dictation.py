@@ -11,7 +11,6 @@ import sys
 import numpy as np
 import tempfile
 from unittest.mock import Mock, patch, MagicMock, call
-import queue
 import threading
 import time
 
@@ -36,8 +35,8 @@ class TestVeleronDictationInitialization:
         assert dictation.sample_rate == 16000
         assert dictation.is_recording is False
         assert dictation.is_running is True
-        assert isinstance(dictation.audio_queue, queue.Queue)
-        assert dictation.audio_data == []
+        assert dictation.audio_buffer.capacity == 300 * 16000
+        assert len(dictation.audio_buffer) == 0
         assert dictation.model is not None
 
     @patch('veleron_dictation.whisper.load_model')
@@ -106,7 +105,7 @@ class TestAudioRecording:
         dictation.start_recording()
 
         assert dictation.is_recording is True
-        assert dictation.audio_data == []
+        assert len(dictation.audio_buffer) == 0
 
     @patch('veleron_dictation.whisper.load_model')
     def test_start_recording_already_recording(self, mock_load_model, mock_whisper_model):
@@ -146,7 +145,8 @@ class TestAudioRecording:
         dictation = VeleronDictation()
 
         dictation.start_recording()
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
         dictation.stop_recording()
 
         assert dictation.is_recording is False
@@ -179,8 +179,8 @@ class TestAudioRecording:
         audio_chunk = sample_audio_data.reshape(-1, 1)
         dictation.audio_callback(audio_chunk, None, None, None)
 
-        # Verify audio was queued
-        assert not dictation.audio_queue.empty()
+        # Verify audio was captured
+        assert len(dictation.audio_buffer) == len(sample_audio_data)
 
     @patch('veleron_dictation.whisper.load_model')
     def test_audio_callback_not_recording(self, mock_load_model, mock_whisper_model, sample_audio_data):
@@ -195,8 +195,8 @@ class TestAudioRecording:
         audio_chunk = sample_audio_data.reshape(-1, 1)
         dictation.audio_callback(audio_chunk, None, None, None)
 
-        # Audio should not be queued
-        assert dictation.audio_queue.empty()
+        # Audio should not be captured
+        assert len(dictation.audio_buffer) == 0
 
 
 class TestTranscriptionAndTyping:
@@ -216,7 +216,8 @@ class TestTranscriptionAndTyping:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
         dictation.transcribe_and_type()
 
         # Verify text was typed
@@ -236,7 +237,8 @@ class TestTranscriptionAndTyping:
 
         # Create very short audio (less than 0.3 seconds)
         short_audio = [np.zeros((100, 1), dtype=np.float32)]
-        dictation.audio_data = short_audio
+        for chunk in short_audio:
+            dictation.audio_buffer.write(chunk)
 
         dictation.transcribe_and_type()
 
@@ -259,7 +261,8 @@ class TestTranscriptionAndTyping:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
         dictation.transcribe_and_type()
 
         # Should handle empty text gracefully
@@ -278,7 +281,8 @@ class TestTranscriptionAndTyping:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
 
         # Should not raise exception, but handle error gracefully
         dictation.transcribe_and_type()
@@ -297,7 +301,8 @@ class TestTranscriptionAndTyping:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
 
         # Track temp files
         import tempfile
@@ -503,14 +508,14 @@ class TestAudioProcessing:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
 
-        # Manually concatenate like the function does
-        audio = np.concatenate(dictation.audio_data, axis=0)
-        audio = audio.flatten()
+        # The buffer holds the chunks back to back, as mono samples
+        audio = dictation.audio_buffer.view()
 
         assert audio.ndim == 1
-        assert len(audio) > 0
+        assert len(audio) == sum(len(chunk) for chunk in sample_audio_chunks)
 
     @patch('veleron_dictation.whisper.load_model')
     def test_audio_format_conversion(
@@ -532,26 +537,29 @@ class TestThreadSafety:
     """Test thread safety and concurrent operations"""
 
     @patch('veleron_dictation.whisper.load_model')
-    def test_queue_thread_safety(self, mock_load_model, mock_whisper_model):
-        """Test that audio queue is thread-safe"""
+    def test_buffer_read_while_recording(self, mock_load_model, mock_whisper_model):
+        """Test that audio can be read while the callback is writing"""
         mock_load_model.return_value = mock_whisper_model
 
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
+        dictation.is_recording = True
 
-        # Simulate multiple threads adding to queue
+        # Simulate the audio callback thread
         def add_audio():
-            for _ in range(10):
-                dictation.audio_queue.put(np.zeros((100, 1)))
+            for _ in range(50):
+                dictation.audio_callback(
+                    np.full((100, 1), 0.5, dtype=np.float32), 100, None, None
+                )
 
-        threads = [threading.Thread(target=add_audio) for _ in range(5)]
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
+        thread = threading.Thread(target=add_audio)
+        thread.start()
+        while thread.is_alive():
+            assert np.all(dictation.audio_buffer.view() == 0.5)
+        thread.join()
 
-        # Verify all items were queued
-        assert dictation.audio_queue.qsize() == 50
+        # Verify all samples were captured
+        assert len(dictation.audio_buffer) == 5000
 
 
 class TestLanguageSupport:
@@ -572,7 +580,8 @@ class TestLanguageSupport:
         for language in ['en', 'es', 'fr', 'de']:
             dictation = VeleronDictation()
             dictation.language = language
-            dictation.audio_data = sample_audio_chunks
+            for chunk in sample_audio_chunks:
+                dictation.audio_buffer.write(chunk)
 
             mock_whisper_model.transcribe.return_value = {
                 "text": f"Test in {language}",
@@ -612,11 +621,12 @@ class TestPerformance:
         large_chunks = [
             np.random.randn(16000, 1).astype(np.float32) for _ in range(10)
         ]
-        dictation.audio_data = large_chunks
+        for chunk in large_chunks:
+            dictation.audio_buffer.write(chunk)
 
         # Should handle large buffer
-        audio = np.concatenate(dictation.audio_data, axis=0)
-        assert len(audio.flatten()) == 160000
+        audio = dictation.audio_buffer.view()
+        assert len(audio) == 160000
 
 
 class TestErrorRecovery:
@@ -633,7 +643,8 @@ class TestErrorRecovery:
         from veleron_dictation import VeleronDictation
         dictation = VeleronDictation()
 
-        dictation.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            dictation.audio_buffer.write(chunk)
 
         # Should not crash, should handle error
         dictation.transcribe_and_type()
@@ -35,7 +35,7 @@ class TestVeleronVoiceFlowInitialization:
         app = VeleronVoiceFlow(root)
 
         assert app.is_recording is False
-        assert app.audio_data == []
+        assert len(app.audio_buffer) == 0
         assert app.sample_rate == 16000
         assert app.model_name == "base"
         assert app.current_language == "auto"
@@ -243,7 +243,7 @@ class TestRecordingFunctionality:
 
         app.start_recording()
 
-        assert app.audio_data == []
+        assert len(app.audio_buffer) == 0
         assert app.is_recording is True
         assert "Recording" in app.status_var.get()
 
@@ -291,7 +291,8 @@ class TestTranscription:
         root = MagicMock()
         app = VeleronVoiceFlow(root)
         app.model = mock_whisper_model
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
 
         app.transcribe_recording()
 
@@ -311,7 +312,7 @@ class TestTranscription:
         root = MagicMock()
         app = VeleronVoiceFlow(root)
         app.model = mock_whisper_model
-        app.audio_data = []
+        app.audio_buffer.clear()
 
         app.transcribe_recording()
 
@@ -334,7 +335,8 @@ class TestTranscription:
         root = MagicMock()
         app = VeleronVoiceFlow(root)
         app.model = mock_whisper_model
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
 
         app.transcribe_recording()
 
@@ -667,7 +669,7 @@ class TestProgressIndicator:
         root = MagicMock()
         app = VeleronVoiceFlow(root)
         app.model = mock_whisper_model
-        app.audio_data = [np.zeros((100, 1))]
+        app.audio_buffer.write(np.zeros((100, 1), dtype=np.float32))
 
         app.stop_recording()
 
@@ -716,7 +718,8 @@ class TestLanguageHandling:
         root = MagicMock()
         app = VeleronVoiceFlow(root)
         app.model = mock_whisper_model
-        app.audio_data = sample_audio_chunks
+        for chunk in sample_audio_chunks:
+            app.audio_buffer.write(chunk)
         app.language_var.set("es")
 
         app.transcribe_recording()
@@ -19,7 +19,6 @@ import pyautogui
 import keyboard
 import sounddevice as sd
 import numpy as np
-import queue
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
@@ -33,6 +32,7 @@ import time
 from pathlib import Path
 from security_utils import sanitize_for_typing, SecurityError
 from temp_file_handler import temp_audio_file, write_audio_to_wav
+from audio_capture import AudioRingBuffer
 import logging
 
 # Configure logging
@@ -49,6 +49,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Longest recording kept in memory, in seconds
+MAX_RECORDING_DURATION = 300
+
 
 class VeleronDictation:
     """Real-time voice dictation system"""
@@ -63,8 +66,9 @@ class VeleronDictation:
         # State
         self.is_recording = False
         self.is_running = True
-        self.audio_queue = queue.Queue()
-        self.audio_data = []
+        self.audio_buffer = AudioRingBuffer(
+            max_duration=MAX_RECORDING_DURATION, sample_rate=self.sample_rate
+        )
         self.model = None
 
         # UI elements
@@ -226,28 +230,17 @@ class VeleronDictation:
         if status:
             print(f"Audio status: {status}")
         if self.is_recording:
-            self.audio_queue.put(indata.copy())
+            self.audio_buffer.write(indata)
 
     def start_recording(self):
         """Start recording audio"""
         if self.is_recording:
             return
 
+        self.audio_buffer.clear()
         self.is_recording = True
-        self.audio_data = []
         self.update_status("🔴 Recording... (release hotkey when done)")
 
-        # Start collecting audio from queue
-        def collect_audio():
-            while self.is_recording:
-                try:
-                    data = self.audio_queue.get(timeout=0.1)
-                    self.audio_data.append(data)
-                except queue.Empty:
-                    continue
-
-        threading.Thread(target=collect_audio, daemon=True).start()
-
     def stop_recording(self):
         """Stop recording and transcribe"""
         if not self.is_recording:
@@ -255,25 +248,35 @@ class VeleronDictation:
 
         self.is_recording = False
 
-        if not self.audio_data:
+        if len(self.audio_buffer) == 0:
             self.update_status("🎤 Ready - Press hotkey to speak")
             return
 
         self.update_status("⏳ Transcribing...")
 
-        # Process in background
-        threading.Thread(target=self.transcribe_and_type, daemon=True).start()
+        # Copy the samples now: the next recording clears the buffer while
+        # this one may still be transcribing
+        audio = self.audio_buffer.copy()
 
-    def transcribe_and_type(self):
-        """Transcribe audio and type it out - SECURE VERSION"""
+        # Process in background
+        threading.Thread(
+            target=self.transcribe_and_type, args=(audio,), daemon=True
+        ).start()
+
+    def transcribe_and_type(self, audio=None):
+        """
+        Transcribe audio and type it out - SECURE VERSION
+
+        Args:
+            audio: Mono samples copied from the buffer; defaults to a copy
+                of the current buffer contents
+        """
         try:
-            # Combine audio chunks
-            audio = np.concatenate(self.audio_data, axis=0)
-            audio = audio.flatten()
+            if audio is None:
+                audio = self.audio_buffer.copy()
 
             # Validate audio length
             MIN_DURATION = 0.3
-            MAX_DURATION = 300  # 5 minutes max
 
             duration = len(audio) / self.sample_rate
 
@@ -283,8 +286,8 @@ class VeleronDictation:
                 self.update_status("🎤 Ready - Press hotkey to speak")
                 return
 
-            if duration > MAX_DURATION:
-                self.update_status(f"⚠️ Audio too long (max: {MAX_DURATION}s)")
+            if len(audio) >= self.audio_buffer.capacity:
+                self.update_status(f"⚠️ Audio too long (max: {MAX_RECORDING_DURATION}s)")
                 time.sleep(1)
                 self.update_status("🎤 Ready - Press hotkey to speak")
                 return
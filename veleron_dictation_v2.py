@@ -14,10 +14,10 @@ License: Internal Use Only
 """
 
 import whisper
+from whisper.vad import speech_regions
 import pyautogui
 import sounddevice as sd
 import numpy as np
-import queue
 import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
@@ -28,7 +28,8 @@ import time
 from datetime import datetime
 from pathlib import Path
 from security_utils import sanitize_for_typing, SecurityError
-from temp_file_handler import temp_audio_file, write_audio_to_wav
+from temp_file_handler import to_whisper_audio
+from audio_capture import AudioRingBuffer
 import logging
 
 # Configure logging
@@ -45,6 +46,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Longest recording kept in memory, in seconds
+MAX_RECORDING_DURATION = 300
+
 
 class VeleronDictationV2:
     """Improved real-time voice dictation system"""
@@ -59,8 +63,9 @@ class VeleronDictationV2:
         # State
         self.is_recording = False
         self.is_running = True
-        self.audio_queue = queue.Queue()
-        self.audio_data = []
+        self.audio_buffer = AudioRingBuffer(
+            max_duration=MAX_RECORDING_DURATION, sample_rate=self.sample_rate
+        )
         self.model = None
 
         # Create main window
@@ -345,8 +350,8 @@ class VeleronDictationV2:
             messagebox.showwarning("No Microphone", "Please select a microphone")
             return
 
+        self.audio_buffer.clear()
         self.is_recording = True
-        self.audio_data = []
         self.record_button.config(bg="#f44336", text="🔴 RECORDING...\n(Release to stop)")
         self.status_var.set("🔴 Recording... Speak now!")
         self.footer_var.set("Recording audio...")
@@ -428,17 +433,23 @@ class VeleronDictationV2:
                 print(f"Final device_spec to use: {device_spec}")
                 print("=" * 60)
 
+                # Samples are copied straight into the ring buffer by the
+                # PortAudio callback; this thread only keeps the stream open
+                def callback(indata, frames, time_info, status):
+                    if status.input_overflow:
+                        print("Audio buffer overflowed")
+                    if self.is_recording:
+                        self.audio_buffer.write(indata)
+
                 with sd.InputStream(
                     samplerate=self.sample_rate,
                     channels=device_channels,
                     device=device_spec,
-                    dtype=np.float32
-                ) as stream:
+                    dtype=np.float32,
+                    callback=callback
+                ):
                     while self.is_recording:
-                        data, overflowed = stream.read(1024)
-                        if overflowed:
-                            print("Audio buffer overflowed")
-                        self.audio_data.append(data)
+                        sd.sleep(50)
             except Exception as e:
                 self.status_var.set(f"❌ Recording error: {str(e)}")
                 messagebox.showerror("Recording Error", str(e))
@@ -455,24 +466,34 @@ class VeleronDictationV2:
         self.status_var.set("⏳ Processing audio...")
         self.footer_var.set("Transcribing...")
 
-        # Process in background
-        threading.Thread(target=self.transcribe_and_type, daemon=True).start()
+        # Copy the samples now: the next recording clears the buffer while
+        # this one may still be transcribing
+        audio = self.audio_buffer.copy()
 
-    def transcribe_and_type(self):
-        """Transcribe audio and type it out - SECURE VERSION"""
+        # Process in background
+        threading.Thread(
+            target=self.transcribe_and_type, args=(audio,), daemon=True
+        ).start()
+
+    def transcribe_and_type(self, audio=None):
+        """
+        Transcribe audio and type it out - SECURE VERSION
+
+        Args:
+            audio: Mono samples copied from the buffer; defaults to a copy
+                of the current buffer contents
+        """
         try:
-            if not self.audio_data:
+            if audio is None:
+                audio = self.audio_buffer.copy()
+
+            if len(audio) == 0:
                 self.status_var.set("⚠️ No audio recorded")
                 self.footer_var.set("Ready to record")
                 return
 
-            # Combine audio chunks
-            audio = np.concatenate(self.audio_data, axis=0)
-            audio = audio.flatten()
-
             # Validate audio length
             MIN_DURATION = 0.3
-            MAX_DURATION = 300  # 5 minutes max
 
             duration = len(audio) / self.sample_rate
 
@@ -481,32 +502,29 @@ class VeleronDictationV2:
                 self.footer_var.set("Ready to record")
                 return
 
-            if duration > MAX_DURATION:
-                self.status_var.set(f"⚠️ Audio too long (max: {MAX_DURATION}s)")
+            if len(audio) >= self.audio_buffer.capacity:
+                self.status_var.set(f"⚠️ Audio too long (max: {MAX_RECORDING_DURATION}s)")
                 self.footer_var.set("Ready to record")
                 return
 
-            # Check audio level
-            max_amplitude = np.max(np.abs(audio))
-            if max_amplitude < 0.01:
+            # Pass the samples to Whisper directly, without a temp WAV file
+            audio = to_whisper_audio(audio, sample_rate=self.sample_rate)
+
+            # Find the speech, so that silence is neither checked nor encoded
+            regions = speech_regions(audio)
+            if not regions:
                 self.status_var.set("⚠️ No speech detected - try speaking louder")
                 self.footer_var.set("Ready to record")
                 return
 
-            # Use secure temporary file handling
-            with temp_audio_file() as temp_path:
-                # Write audio to secure temp file
-                write_audio_to_wav(temp_path, audio, sample_rate=self.sample_rate)
-
-                # Transcribe
-                language = None if self.language_var.get() == "auto" else self.language_var.get()
-                result = self.model.transcribe(
-                    str(temp_path),
-                    language=language,
-                    fp16=False
-                )
-
-                # Temp file automatically deleted after this block
+            # Transcribe
+            language = None if self.language_var.get() == "auto" else self.language_var.get()
+            result = self.model.transcribe(
+                audio,
+                language=language,
+                fp16=False,
+                clip_timestamps=[ts for region in regions for ts in region]
+            )
 
             # Get transcribed text
             text = result["text"].strip()
@@ -39,7 +39,8 @@ import logging
 
 # Security imports
 from security_utils import sanitize_for_typing, validate_path, SecurityError
-from temp_file_handler import temp_audio_file, write_audio_to_wav
+from temp_file_handler import to_whisper_audio
+from audio_capture import AudioRingBuffer
 
 # Office installer
 from office_installer import OfficeInstaller
@@ -47,6 +48,9 @@ from office_installer import OfficeInstaller
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Longest recording kept in memory, in seconds
+MAX_RECORDING_DURATION = 600
+
 
 class VeleronVoiceFlow:
     """Main application class for Veleron Voice Flow"""
@@ -58,8 +62,10 @@ class VeleronVoiceFlow:
 
         # Application state
         self.is_recording = False
-        self.audio_data = []
         self.sample_rate = 16000  # Whisper uses 16kHz
+        self.audio_buffer = AudioRingBuffer(
+            max_duration=MAX_RECORDING_DURATION, sample_rate=self.sample_rate
+        )
         self.model = None
         self.model_name = "base"
         self.current_language = "auto"
@@ -710,8 +716,8 @@ class VeleronVoiceFlow:
             return
 
         self.log("Starting recording...")
+        self.audio_buffer.clear()
         self.is_recording = True
-        self.audio_data = []
         self.record_button.config(text="⏹ Stop Recording")
         self.status_var.set("Recording... Speak now")
 
@@ -739,12 +745,8 @@ class VeleronVoiceFlow:
             def callback(indata, frames, time, status):
                 if status:
                     self.log(f"Recording status: {status}", "WARNING")
-                # If stereo, convert to mono by averaging channels
-                if indata.shape[1] > 1:
-                    mono_data = np.mean(indata, axis=1, keepdims=True)
-                    self.audio_data.append(mono_data.copy())
-                else:
-                    self.audio_data.append(indata.copy())
+                # Copied into preallocated memory, averaging stereo into mono
+                self.audio_buffer.write(indata)
 
             # CRITICAL FIX VERSION 2: Try using DirectSound instead of WASAPI
             # Your C922 webcam reports as WASAPI but fails with WDM-KS errors
@@ -893,48 +895,57 @@ class VeleronVoiceFlow:
         self.status_var.set("Processing audio...")
         self.progress.start()
 
+        # Copy the samples now: the next recording clears the buffer while
+        # this one may still be transcribing
+        audio = self.audio_buffer.copy()
+
         # Transcribe in background thread
-        threading.Thread(target=self.transcribe_recording, daemon=True).start()
+        threading.Thread(
+            target=self.transcribe_recording, args=(audio,), daemon=True
+        ).start()
 
-    def transcribe_recording(self):
-        """Transcribe the recorded audio - SECURE VERSION"""
+    def transcribe_recording(self, audio=None):
+        """
+        Transcribe the recorded audio - SECURE VERSION
+
+        Args:
+            audio: Mono samples copied from the buffer; defaults to a copy
+                of the current buffer contents
+        """
         try:
-            if not self.audio_data:
+            if audio is None:
+                audio = self.audio_buffer.copy()
+
+            if len(audio) == 0:
                 self.log("No audio data recorded", "WARNING")
                 self.status_var.set("No audio recorded")
                 self.progress.stop()
                 return
 
-            self.log(f"Processing {len(self.audio_data)} audio chunks...")
-
-            # Combine audio chunks
-            audio = np.concatenate(self.audio_data, axis=0)
-            audio = audio.flatten()
+            self.log(f"Processing {len(audio) / self.sample_rate:.1f}s of audio...")
+            if len(audio) >= self.audio_buffer.capacity:
+                self.log(
+                    f"Recording exceeded {MAX_RECORDING_DURATION}s; "
+                    "only the last part is transcribed",
+                    "WARNING"
+                )
 
             self.log(f"Audio shape: {audio.shape}, dtype: {audio.dtype}")
 
-            # SECURITY FIX: Use secure temp file
-            with temp_audio_file() as temp_path:
-                self.log(f"Saving audio to secure temp file: {temp_path}")
-
-                # Write audio using secure handler
-                write_audio_to_wav(temp_path, audio, sample_rate=self.sample_rate)
-
-                self.log(f"Audio file created successfully: {os.path.getsize(temp_path)} bytes")
+            # Pass the samples to Whisper directly, without a temp WAV file
+            audio = to_whisper_audio(audio, sample_rate=self.sample_rate)
 
-                # Transcribe
-                self.log(f"Starting transcription with model: {self.model_name}")
-                language = None if self.language_var.get() == "auto" else self.language_var.get()
-
-                result = self.model.transcribe(
-                    str(temp_path),
-                    language=language,
-                    fp16=False
-                )
+            # Transcribe
+            self.log(f"Starting transcription with model: {self.model_name}")
+            language = None if self.language_var.get() == "auto" else self.language_var.get()
 
-                self.log(f"Transcription complete. Detected language: {result.get('language', 'unknown')}")
+            result = self.model.transcribe(
+                audio,
+                language=language,
+                fp16=False
+            )
 
-                # Temp file automatically cleaned up when context exits
+            self.log(f"Transcription complete. Detected language: {result.get('language', 'unknown')}")
 
             # Update UI
             self.root.after(0, self.display_transcription, result)
@@ -1,6 +1,9 @@
 import hashlib
+import inspect
 import io
+import json
 import os
+import threading
 import urllib
 import warnings
 from typing import List, Optional, Union
@@ -10,7 +13,7 @@ from tqdm import tqdm
 
 from .audio import load_audio, log_mel_spectrogram, pad_or_trim
 from .decoding import DecodingOptions, DecodingResult, decode, detect_language
-from .model import ModelDimensions, Whisper
+from .model import AudioFeaturesCache, ModelDimensions, Whisper
 from .transcribe import transcribe
 from .version import __version__
 
@@ -51,6 +54,36 @@ _ALIGNMENT_HEADS = {
 }
 
 
+def _sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _stamp(path: str, sha256: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+
+
+def _is_verified(path: str, expected_sha256: str) -> bool:
+    """Whether the sidecar stamp shows that the file, as it is now, has the expected checksum"""
+    try:
+        with open(path + ".verified") as f:
+            return json.load(f) == _stamp(path, expected_sha256)
+    except (OSError, ValueError):
+        return False
+
+
+def _mark_verified(path: str, sha256: str):
+    try:
+        with open(path + ".verified", "w") as f:
+            json.dump(_stamp(path, sha256), f)
+    except OSError:
+        pass  # e.g. a read-only cache directory; the file will be hashed again next time
+
+
 def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
     os.makedirs(root, exist_ok=True)
 
@@ -61,15 +94,23 @@ def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
         raise RuntimeError(f"{download_target} exists and is not a regular file")
 
     if os.path.isfile(download_target):
-        with open(download_target, "rb") as f:
-            model_bytes = f.read()
-        if hashlib.sha256(model_bytes).hexdigest() == expected_sha256:
-            return model_bytes if in_memory else download_target
+        # the file is only hashed again when it changed since it was last verified
+        verified = _is_verified(download_target, expected_sha256)
+        if not verified and _sha256(download_target) == expected_sha256:
+            _mark_verified(download_target, expected_sha256)
+            verified = True
+
+        if verified:
+            if in_memory:
+                with open(download_target, "rb") as f:
+                    return f.read()
+            return download_target
         else:
             warnings.warn(
                 f"{download_target} exists, but the SHA256 checksum does not match; re-downloading the file"
             )
 
+    sha256 = hashlib.sha256()
     with urllib.request.urlopen(url) as source, open(download_target, "wb") as output:
         with tqdm(
             total=int(source.info().get("Content-Length")),
@@ -84,15 +125,19 @@ def _download(url: str, root: str, in_memory: bool) -> Union[bytes, str]:
                     break
 
                 output.write(buffer)
+                sha256.update(buffer)
                 loop.update(len(buffer))
 
-    model_bytes = open(download_target, "rb").read()
-    if hashlib.sha256(model_bytes).hexdigest() != expected_sha256:
+    if sha256.hexdigest() != expected_sha256:
         raise RuntimeError(
             "Model has been downloaded but the SHA256 checksum does not not match. Please retry loading the model."
         )
+    _mark_verified(download_target, expected_sha256)
 
-    return model_bytes if in_memory else download_target
+    if in_memory:
+        with open(download_target, "rb") as f:
+            return f.read()
+    return download_target
 
 
 def available_models() -> List[str]:
@@ -100,11 +145,53 @@ def available_models() -> List[str]:
     return list(_MODELS.keys())
 
 
+def _supports_mmap() -> bool:
+    # torch.load(mmap=True) and load_state_dict(assign=True) were both added in PyTorch 2.1
+    return "mmap" in inspect.signature(torch.load).parameters and (
+        "assign" in inspect.signature(torch.nn.Module.load_state_dict).parameters
+    )
+
+
+def _load_mmap(
+    checkpoint_file: str, device: Union[str, torch.device]
+) -> Optional[Whisper]:
+    """
+    Load the checkpoint by memory-mapping the file and assigning each weight directly to a model
+    created on the meta device, so that the weights are not held in memory twice while loading.
+    Only weights already in the model's dtype and on the target device stay backed by the file and
+    share its page cache with other processes; the official checkpoints are fp16 and are converted
+    to fp32 copies, so on the CPU they take private memory as before.
+    Returns None if the checkpoint cannot be memory-mapped, e.g. in the legacy serialization format.
+    """
+    try:
+        checkpoint = torch.load(
+            checkpoint_file, map_location="cpu", mmap=True, weights_only=True
+        )
+    except RuntimeError:
+        return None
+
+    dims = ModelDimensions(**checkpoint["dims"])
+    with torch.device("meta"):
+        model = Whisper(dims)
+
+    # convert to the dtype of the model, as load_state_dict() would when copying;
+    # to() returns the memory-mapped tensor itself when no conversion is needed
+    dtypes = {name: tensor.dtype for name, tensor in model.state_dict().items()}
+    state_dict = checkpoint["model_state_dict"]
+    for name, tensor in state_dict.items():
+        state_dict[name] = tensor.to(device=device, dtype=dtypes.get(name))
+    model.load_state_dict(state_dict, assign=True)
+
+    return model
+
+
 def load_model(
     name: str,
     device: Optional[Union[str, torch.device]] = None,
     download_root: str = None,
     in_memory: bool = False,
+    quantize: Optional[str] = None,
+    warm_up: bool = False,
 ) -> Whisper:
     """
     Load a Whisper ASR model
@@ -120,6 +207,11 @@ def load_model(
         path to download the model files; by default, it uses "~/.cache/whisper"
     in_memory: bool
         whether to preload the model weights into host memory
+    quantize: str
+        if "int8", quantize the Linear layers for faster inference on the CPU; see `Whisper.quantize()`
+    warm_up: bool
+        whether to compile the word-timestamp kernels in a background thread, so that the first
+        transcription with `word_timestamps=True` does not wait for numba
 
     Returns
     -------
@@ -144,18 +236,32 @@ def load_model(
             f"Model {name} not found; available models = {available_models()}"
         )
 
-    with (
-        io.BytesIO(checkpoint_file) if in_memory else open(checkpoint_file, "rb")
-    ) as fp:
-        kwargs = {"weights_only": True} if torch.__version__ >= "1.13" else {}
-        checkpoint = torch.load(fp, map_location=device, **kwargs)
-    del checkpoint_file
+    model = None
+    if not in_memory and _supports_mmap():
+        model = _load_mmap(checkpoint_file, device)
 
-    dims = ModelDimensions(**checkpoint["dims"])
-    model = Whisper(dims)
-    model.load_state_dict(checkpoint["model_state_dict"])
+    if model is None:
+        with (
+            io.BytesIO(checkpoint_file) if in_memory else open(checkpoint_file, "rb")
+        ) as fp:
+            kwargs = {"weights_only": True} if torch.__version__ >= "1.13" else {}
+            checkpoint = torch.load(fp, map_location=device, **kwargs)
+        del checkpoint_file
+
+        dims = ModelDimensions(**checkpoint["dims"])
+        model = Whisper(dims)
+        model.load_state_dict(checkpoint["model_state_dict"])
 
     if alignment_heads is not None:
         model.set_alignment_heads(alignment_heads)
 
-    return model.to(device)
+    model = model.to(device)
+    if quantize is not None:
+        model.quantize(quantize)
+
+    if warm_up:
+        from .timing import warm_up as warm_up_timing
+
+        threading.Thread(target=warm_up_timing, daemon=True).start()
+
+    return model
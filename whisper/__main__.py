@@ -1,3 +1,10 @@
-from .transcribe import cli
+import sys
+
+if len(sys.argv) > 1 and sys.argv[1] == "serve":
+    from .server import cli
+
+    del sys.argv[1]
+else:
+    from .transcribe import cli
 
 cli()
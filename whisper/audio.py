@@ -1,7 +1,8 @@
 import os
+import tempfile
 from functools import lru_cache
-from subprocess import CalledProcessError, run
-from typing import Optional, Union
+from subprocess import PIPE, Popen
+from typing import Iterable, Iterator, List, Optional, Union
 
 import numpy as np
 import torch
@@ -22,21 +23,10 @@ FRAMES_PER_SECOND = exact_div(SAMPLE_RATE, HOP_LENGTH)  # 10ms per audio frame
 TOKENS_PER_SECOND = exact_div(SAMPLE_RATE, N_SAMPLES_PER_TOKEN)  # 20ms per audio token
 
 
-def load_audio(file: str, sr: int = SAMPLE_RATE):
+def _ffmpeg_pcm_blocks(file: str, sr: int, block_size: int) -> Iterator[np.ndarray]:
     """
-    Open an audio file and read as mono waveform, resampling as necessary
-
-    Parameters
-    ----------
-    file: str
-        The audio file to open
-
-    sr: int
-        The sample rate to resample the audio if necessary
-
-    Returns
-    -------
-    A NumPy array containing the audio waveform, in float32 dtype.
+    Decode `file` with ffmpeg and yield the mono int16 waveform in blocks of `block_size` samples
+    (the last one may be shorter) as soon as they are read from ffmpeg's stdout.
     """
 
     # This launches a subprocess to decode audio while down-mixing
@@ -54,12 +44,81 @@ def load_audio(file: str, sr: int = SAMPLE_RATE):
         "-"
     ]
     # fmt: on
-    try:
-        out = run(cmd, capture_output=True, check=True).stdout
-    except CalledProcessError as e:
-        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
 
-    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+    # stderr goes to a file so that ffmpeg can never block on a full pipe that we don't read
+    with tempfile.TemporaryFile() as stderr:
+        process = Popen(cmd, stdout=PIPE, stderr=stderr)
+        try:
+            while chunk := process.stdout.read(block_size * 2):
+                yield np.frombuffer(chunk[: len(chunk) // 2 * 2], np.int16)
+        except BaseException:
+            # also reached when the consumer stops iterating early
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"Failed to load audio: {stderr.read().decode()}")
+
+
+def load_audio(file: str, sr: int = SAMPLE_RATE):
+    """
+    Open an audio file and read as mono waveform, resampling as necessary
+
+    Parameters
+    ----------
+    file: str
+        The audio file to open
+
+    sr: int
+        The sample rate to resample the audio if necessary
+
+    Returns
+    -------
+    A NumPy array containing the audio waveform, in float32 dtype.
+    """
+    # ffmpeg's output is converted block by block into a growable float32 buffer,
+    # instead of holding the whole s16le output plus its int16 and float32 copies.
+    audio = np.empty(N_SAMPLES, dtype=np.float32)
+    length = 0
+    for block in _ffmpeg_pcm_blocks(file, sr, N_SAMPLES):
+        if length + len(block) > len(audio):
+            audio.resize(max(2 * len(audio), length + len(block)), refcheck=False)
+        audio[length : length + len(block)] = block
+        length += len(block)
+
+    audio.resize(length, refcheck=False)
+    audio /= 32768.0
+    return audio
+
+
+def stream_audio(
+    file: str, sr: int = SAMPLE_RATE, chunk_length: int = CHUNK_LENGTH
+) -> Iterator[np.ndarray]:
+    """
+    Open an audio file and yield the mono waveform incrementally while it is being decoded
+
+    Parameters
+    ----------
+    file: str
+        The audio file to open
+
+    sr: int
+        The sample rate to resample the audio if necessary
+
+    chunk_length: int
+        The length in seconds of each yielded block; the last block may be shorter
+
+    Returns
+    -------
+    An iterator of NumPy arrays containing consecutive blocks of the audio waveform, in float32
+    dtype. Concatenated, they are equal to the output of `load_audio(file, sr)`.
+    """
+    for block in _ffmpeg_pcm_blocks(file, sr, chunk_length * sr):
+        yield block.astype(np.float32) / 32768.0
 
 
 def pad_or_trim(array, length: int = N_SAMPLES, *, axis: int = -1):
@@ -107,6 +166,23 @@ def mel_filters(device, n_mels: int) -> torch.Tensor:
         return torch.from_numpy(f[f"mel_{n_mels}"]).to(device)
 
 
+def _log_mel_frames(padded: torch.Tensor, n_mels: int) -> torch.Tensor:
+    """
+    Compute the unclamped log10 Mel energies of every full STFT frame in `padded`, a waveform that
+    already includes the reflection padding which `torch.stft(center=True)` would add.
+    """
+    window = torch.hann_window(N_FFT).to(padded.device)
+    stft = torch.stft(
+        padded, N_FFT, HOP_LENGTH, window=window, center=False, return_complex=True
+    )
+    magnitudes = stft.abs() ** 2
+
+    filters = mel_filters(padded.device, n_mels)
+    mel_spec = filters @ magnitudes
+
+    return torch.clamp(mel_spec, min=1e-10).log10()
+
+
 def log_mel_spectrogram(
     audio: Union[str, np.ndarray, torch.Tensor],
     n_mels: int = 80,
@@ -144,14 +220,144 @@ def log_mel_spectrogram(
         audio = audio.to(device)
     if padding > 0:
         audio = F.pad(audio, (0, padding))
-    window = torch.hann_window(N_FFT).to(audio.device)
-    stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
-    magnitudes = stft[..., :-1].abs() ** 2
 
-    filters = mel_filters(audio.device, n_mels)
-    mel_spec = filters @ magnitudes
+    # reflect-pad as torch.stft(center=True) would, then run the STFT over blocks of N_FRAMES
+    # frames, so that only one block of the complex spectrogram is in memory at a time.
+    # The last frame is dropped, as it only covers the reflection padding.
+    n_frames = audio.shape[-1] // HOP_LENGTH
+    padded = F.pad(
+        audio.reshape(1, -1, audio.shape[-1]), (N_FFT // 2, N_FFT // 2), mode="reflect"
+    ).reshape(*audio.shape[:-1], -1)
+    log_spec = torch.cat(
+        [
+            _log_mel_frames(
+                padded[..., start * HOP_LENGTH : end * HOP_LENGTH + N_FFT - HOP_LENGTH],
+                n_mels,
+            )
+            for start, end in (
+                (start, min(start + N_FRAMES, n_frames))
+                for start in range(0, n_frames, N_FRAMES)
+            )
+        ],
+        dim=-1,
+    )
 
-    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
     log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
     log_spec = (log_spec + 4.0) / 4.0
     return log_spec
+
+
+def log_mel_spectrogram_windows(
+    audio: Union[str, np.ndarray, torch.Tensor, Iterable[np.ndarray]],
+    n_mels: int = 80,
+    padding: int = 0,
+    device: Optional[Union[str, torch.device]] = None,
+    clamp: str = "window",
+) -> Iterator[torch.Tensor]:
+    """
+    Compute the log-Mel spectrogram incrementally, as consecutive windows of N_FRAMES frames
+
+    The STFT is computed block by block as audio arrives, with the same edge handling as
+    `log_mel_spectrogram`, so a window is available as soon as its audio has been read. Since the
+    maximum over the whole audio is not known in advance, the dynamic range is clamped according
+    to the `clamp` policy instead.
+
+    Parameters
+    ----------
+    audio: Union[str, np.ndarray, torch.Tensor, Iterable[np.ndarray]], shape = (n_samples,)
+        The path to audio, a NumPy array or Tensor containing the audio waveform in 16 kHz, or an
+        iterable of consecutive waveform blocks such as the output of `stream_audio()`
+
+    n_mels: int
+        The number of Mel-frequency filters, only 80 and 128 are supported
+
+    padding: int
+        Number of zero samples to pad to the right
+
+    device: Optional[Union[str, torch.device]]
+        If given, the audio blocks are moved to this device before STFT
+
+    clamp: str
+        "window" clamps each window to 8 (in log10 units) below the window's own maximum;
+        "running" clamps it to 8 below the maximum of all frames computed so far, which gives the
+        same values as `log_mel_spectrogram` once the loudest frame of the audio has been seen.
+
+    Returns
+    -------
+    Iterator[torch.Tensor], shape = (n_mels, N_FRAMES)
+        The consecutive windows of the log-Mel spectrogram; the last one may be shorter
+    """
+    if clamp not in {"window", "running"}:
+        raise ValueError(f"Unsupported clamp policy: {clamp}")
+
+    if isinstance(audio, str):
+        audio = stream_audio(audio)
+    elif torch.is_tensor(audio) or isinstance(audio, np.ndarray):
+        audio = [audio]
+
+    def blocks() -> Iterator[torch.Tensor]:
+        for block in audio:
+            block = block if torch.is_tensor(block) else torch.from_numpy(block)
+            yield block if device is None else block.to(device)
+        if padding > 0:
+            yield torch.zeros(padding, device=device)
+
+    half = N_FFT // 2
+    pending: List[torch.Tensor] = []  # waveform blocks not yet covered by a full frame
+    buffer: Optional[torch.Tensor] = None  # padded waveform from the next frame onwards
+    n_samples = 0
+    frames: List[torch.Tensor] = []  # log-Mel frames not yet yielded
+    n_frames = 0  # number of log-Mel frames computed so far
+    running_max = -np.inf
+
+    def normalize(log_spec: torch.Tensor) -> torch.Tensor:
+        nonlocal running_max
+        log_max = log_spec.max().item()
+        if clamp == "running":
+            running_max = log_max = max(running_max, log_max)
+        log_spec = torch.clamp(log_spec, min=log_max - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def compute_frames(limit: Optional[int] = None):
+        nonlocal buffer, n_frames
+        count = (buffer.shape[-1] - N_FFT) // HOP_LENGTH + 1
+        if limit is not None:
+            count = min(count, limit - n_frames)
+        if count > 0:
+            end = (count - 1) * HOP_LENGTH + N_FFT
+            frames.append(_log_mel_frames(buffer[:end], n_mels))
+            buffer = buffer[count * HOP_LENGTH :]
+            n_frames += count
+
+    for block in blocks():
+        n_samples += block.shape[-1]
+        pending.append(block)
+        if buffer is None:
+            if n_samples <= half:
+                continue  # the left reflection needs at least half + 1 samples
+            waveform = torch.cat(pending)
+            buffer = torch.cat([waveform[1 : half + 1].flip(0), waveform])
+        else:
+            buffer = torch.cat([buffer, *pending])
+        pending = []
+
+        compute_frames()
+        while sum(f.shape[-1] for f in frames) >= N_FRAMES:
+            log_spec = torch.cat(frames, dim=-1)
+            frames = [log_spec[:, N_FRAMES:]]
+            yield normalize(log_spec[:, :N_FRAMES])
+
+    if buffer is None:
+        # too short for incremental processing; fall back to padding everything at once
+        waveform = torch.cat(pending)
+        buffer = F.pad(waveform.view(1, 1, -1), (half, 0), mode="reflect").view(-1)
+
+    # add the right reflection; frames that only cover the padding are dropped as in
+    # `log_mel_spectrogram`
+    buffer = torch.cat([buffer, buffer[-half - 1 : -1].flip(0)])
+    compute_frames(limit=n_samples // HOP_LENGTH)
+
+    if frames:
+        log_spec = torch.cat(frames, dim=-1)
+        for start in range(0, log_spec.shape[-1], N_FRAMES):
+            yield normalize(log_spec[:, start : start + N_FRAMES])
@@ -1,4 +1,5 @@
 from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
@@ -49,7 +50,7 @@ def detect_language(
 
     # skip encoder forward pass if already-encoded audio features were given
     if mel.shape[-2:] != (model.dims.n_audio_ctx, model.dims.n_audio_state):
-        mel = model.encoder(mel)
+        mel = model.embed_audio(mel)
 
     # forward pass using a single token, startoftranscript
     n_audio = mel.shape[0]
@@ -142,9 +143,18 @@ class Inference:
 
 
 class PyTorchInference(Inference):
-    def __init__(self, model: "Whisper", initial_token_length: int):
+    def __init__(
+        self,
+        model: "Whisper",
+        initial_token_length: int,
+        max_length: Optional[int] = None,
+        persistent: bool = False,
+    ):
         self.model: "Whisper" = model
         self.initial_token_length = initial_token_length
+        self.max_length = max_length  # preallocate the kv cache for this many positions
+        self.persistent = persistent  # keep the hooks installed until remove_hooks()
+        self.active = False
         self.kv_cache = {}
         self.hooks = []
 
@@ -153,27 +163,51 @@ class PyTorchInference(Inference):
         self.kv_modules = key_modules + value_modules
 
     def logits(self, tokens: Tensor, audio_features: Tensor) -> Tensor:
-        if not self.kv_cache:
-            self.kv_cache, self.hooks = self.model.install_kv_cache_hooks()
+        if not self.hooks:
+            self.kv_cache, self.hooks = self.model.install_kv_cache_hooks(
+                max_length=self.max_length,
+                enabled=(lambda: self.active) if self.persistent else None,
+            )
+        self.active = True
 
-        if tokens.shape[-1] > self.initial_token_length:
-            # only need to use the last token except in the first forward pass
-            tokens = tokens[:, -1:]
+        if tokens.shape[-1] > self.initial_token_length and self.kv_cache:
+            # only need to use the tokens that are not in the kv cache yet
+            tokens = tokens[:, self.kv_cache[self.kv_modules[0]].shape[1] :]
 
         return self.model.decoder(tokens, audio_features, kv_cache=self.kv_cache)
 
     def cleanup_caching(self):
+        self.active = False
+        if self.persistent:
+            self.kv_cache.clear()  # the hooks refer to this dictionary
+        else:
+            self.remove_hooks()
+
+    def remove_hooks(self):
         for hook in self.hooks:
             hook.remove()
 
         self.kv_cache = {}
         self.hooks = []
 
+    def truncate_kv_cache(self, length: int):
+        """Discard the cached keys and values of the positions from `length` on"""
+        for module in self.kv_modules:
+            if module in self.kv_cache:
+                self.kv_cache[module] = self.kv_cache[module][:, :length]
+
     def rearrange_kv_cache(self, source_indices):
-        if source_indices != list(range(len(source_indices))):
+        source_indices = torch.as_tensor(source_indices, device=self.model.device)
+        identity = torch.arange(len(source_indices), device=source_indices.device)
+        if not torch.equal(source_indices, identity):
             for module in self.kv_modules:
-                # update the key/value cache to contain the selected sequences
-                self.kv_cache[module] = self.kv_cache[module][source_indices].detach()
+                cache = self.kv_cache[module]
+                if self.max_length is None:
+                    # update the key/value cache to contain the selected sequences
+                    self.kv_cache[module] = cache[source_indices].detach()
+                else:
+                    # gather the selected sequences within the preallocated buffers
+                    cache.copy_(cache.index_select(0, source_indices))
 
 
 class SequenceRanker:
@@ -270,14 +304,22 @@ class TokenDecoder:
 
 
 class GreedyDecoder(TokenDecoder):
-    def __init__(self, temperature: float, eot: int):
+    def __init__(self, temperature: Union[float, Tensor], eot: int):
+        # a Tensor of shape (n_batch,) gives each sequence its own temperature
         self.temperature = temperature
         self.eot = eot
 
     def update(
         self, tokens: Tensor, logits: Tensor, sum_logprobs: Tensor
     ) -> Tuple[Tensor, bool]:
-        if self.temperature == 0:
+        if isinstance(self.temperature, Tensor):
+            greedy = self.temperature == 0
+            scale = torch.where(
+                greedy, torch.ones_like(self.temperature), self.temperature
+            )
+            next_tokens = Categorical(logits=logits / scale[:, None]).sample()
+            next_tokens = torch.where(greedy, logits.argmax(dim=-1), next_tokens)
+        elif self.temperature == 0:
             next_tokens = logits.argmax(dim=-1)
         else:
             next_tokens = Categorical(logits=logits / self.temperature).sample()
@@ -330,49 +372,50 @@ class BeamSearchDecoder(TokenDecoder):
         if self.finished_sequences is None:  # for the first update
             self.finished_sequences = [{} for _ in range(n_audio)]
 
+        # STEP 1: calculate the cumulative log probabilities for possible candidates, which are the
+        # top beam_size + 1 continuations of each beam, as (n_audio, beam_size * (beam_size + 1))
         logprobs = F.log_softmax(logits.float(), dim=-1)
-        next_tokens, source_indices, finished_sequences = [], [], []
-        for i in range(n_audio):
-            scores, sources, finished = {}, {}, {}
-
-            # STEP 1: calculate the cumulative log probabilities for possible candidates
-            for j in range(self.beam_size):
-                idx = i * self.beam_size + j
-                prefix = tokens[idx].tolist()
-                for logprob, token in zip(*logprobs[idx].topk(self.beam_size + 1)):
-                    new_logprob = (sum_logprobs[idx] + logprob).item()
-                    sequence = tuple(prefix + [token.item()])
-                    scores[sequence] = new_logprob
-                    sources[sequence] = idx
-
-            # STEP 2: rank the candidates and keep the top beam_size sequences for each audio
-            saved = 0
-            for sequence in sorted(scores, key=scores.get, reverse=True):
-                if sequence[-1] == self.eot:
-                    finished[sequence] = scores[sequence]
-                else:
-                    sum_logprobs[len(next_tokens)] = scores[sequence]
-                    next_tokens.append(sequence)
-                    source_indices.append(sources[sequence])
-
-                    saved += 1
-                    if saved == self.beam_size:
-                        break
-
-            finished_sequences.append(finished)
-
-        tokens = torch.tensor(next_tokens, device=tokens.device)
+        top_logprobs, top_tokens = logprobs.topk(self.beam_size + 1)
+        scores = (sum_logprobs[:, None] + top_logprobs).reshape(n_audio, -1)
+        candidates = top_tokens.reshape(n_audio, -1)
+        sources = torch.arange(tokens.shape[0], device=tokens.device)
+        sources = sources.repeat_interleave(self.beam_size + 1).reshape(n_audio, -1)
+
+        # identical beams, e.g. all of them at the first step, propose the same sequences; only the
+        # candidates of the first of them are considered
+        beams = tokens.reshape(n_audio, self.beam_size, -1)
+        same = (beams[:, :, None] == beams[:, None]).all(dim=-1).tril(diagonal=-1)
+        valid = (~same.any(dim=-1)).repeat_interleave(self.beam_size + 1, dim=-1)
+
+        # STEP 2: rank the candidates and keep the top beam_size sequences for each audio;
+        # the sort is stable, so that ties are broken by the order of the beams
+        order = scores.masked_fill(~valid, -np.inf)
+        order = order.sort(dim=-1, descending=True, stable=True).indices
+        scores, candidates, sources, valid = (
+            x.gather(1, order) for x in (scores, candidates, sources, valid)
+        )
+        eot = candidates == self.eot
+        # the number of unfinished sequences up to each candidate; only beam_size of them are kept,
+        # and only the finished sequences ranked before the last one kept are recorded
+        saved = (valid & ~eot).cumsum(dim=-1)
+        keep = (valid & ~eot & (saved <= self.beam_size)).nonzero()[:, 1]
+        keep = keep.reshape(n_audio, self.beam_size)
+        finished = valid & eot & (saved < self.beam_size)
+
+        source_indices = sources.gather(1, keep).flatten()
+        sum_logprobs[:] = scores.gather(1, keep).flatten()
+        next_tokens = candidates.gather(1, keep).flatten()
         self.inference.rearrange_kv_cache(source_indices)
 
-        # add newly finished sequences to self.finished_sequences
-        assert len(self.finished_sequences) == len(finished_sequences)
-        for previously_finished, newly_finished in zip(
-            self.finished_sequences, finished_sequences
-        ):
-            for seq in sorted(newly_finished, key=newly_finished.get, reverse=True):
-                if len(previously_finished) >= self.max_candidates:
-                    break  # the candidate list is full
-                previously_finished[seq] = newly_finished[seq]
+        # add newly finished sequences to self.finished_sequences, in the order of their scores
+        if finished.any():
+            for i, j in finished.nonzero().tolist():
+                if len(self.finished_sequences[i]) >= self.max_candidates:
+                    continue  # the candidate list is full
+                sequence = tokens[sources[i, j]].tolist() + [self.eot]
+                self.finished_sequences[i][tuple(sequence)] = scores[i, j].item()
+
+        tokens = torch.cat([tokens[source_indices], next_tokens[:, None]], dim=-1)
 
         # mark as completed if all audio has enough number of samples
         completed = all(
@@ -420,22 +463,31 @@ class LogitFilter:
         raise NotImplementedError
 
 
+@lru_cache(maxsize=None)
+def token_index(tokens: Tuple[int], device: torch.device) -> Tensor:
+    """A cached index tensor of the given tokens on the device, for suppressing them in the logits"""
+    return torch.tensor(tokens, dtype=torch.long, device=device)
+
+
 class SuppressBlank(LogitFilter):
     def __init__(self, tokenizer: Tokenizer, sample_begin: int):
         self.tokenizer = tokenizer
         self.sample_begin = sample_begin
+        self.blank_tokens = tuple(tokenizer.encode(" ") + [tokenizer.eot])
 
     def apply(self, logits: Tensor, tokens: Tensor):
         if tokens.shape[1] == self.sample_begin:
-            logits[:, self.tokenizer.encode(" ") + [self.tokenizer.eot]] = -np.inf
+            index = token_index(self.blank_tokens, logits.device)
+            logits.index_fill_(-1, index, -np.inf)
 
 
 class SuppressTokens(LogitFilter):
     def __init__(self, suppress_tokens: Sequence[int]):
-        self.suppress_tokens = list(suppress_tokens)
+        self.suppress_tokens = tuple(suppress_tokens)
 
     def apply(self, logits: Tensor, tokens: Tensor):
-        logits[:, self.suppress_tokens] = -np.inf
+        index = token_index(self.suppress_tokens, logits.device)
+        logits.index_fill_(-1, index, -np.inf)
 
 
 class ApplyTimestampRules(LogitFilter):
@@ -455,54 +507,136 @@ class ApplyTimestampRules(LogitFilter):
             logits[:, self.tokenizer.no_timestamps] = -np.inf
 
         # timestamps have to appear in pairs, except directly before EOT; mask logits accordingly
-        for k in range(tokens.shape[0]):
-            sampled_tokens = tokens[k, self.sample_begin :]
-            seq = [t for t in sampled_tokens.tolist()]
-            last_was_timestamp = (
-                len(seq) >= 1 and seq[-1] >= self.tokenizer.timestamp_begin
-            )
-            penultimate_was_timestamp = (
-                len(seq) < 2 or seq[-2] >= self.tokenizer.timestamp_begin
-            )
-
-            if last_was_timestamp:
-                if penultimate_was_timestamp:  # has to be non-timestamp
-                    logits[k, self.tokenizer.timestamp_begin :] = -np.inf
-                else:  # cannot be normal text tokens
-                    logits[k, : self.tokenizer.eot] = -np.inf
-
-            timestamps = sampled_tokens[
-                sampled_tokens.ge(self.tokenizer.timestamp_begin)
-            ]
-            if timestamps.numel() > 0:
-                # timestamps shouldn't decrease; forbid timestamp tokens smaller than the last
-                # also force each segment to have a nonzero length, to prevent infinite looping
-                if last_was_timestamp and not penultimate_was_timestamp:
-                    timestamp_last = timestamps[-1]
-                else:
-                    timestamp_last = timestamps[-1] + 1
-                logits[k, self.tokenizer.timestamp_begin : timestamp_last] = -np.inf
+        timestamp_begin = self.tokenizer.timestamp_begin
+        if tokens.shape[0] == 1:
+            # a single sequence is cheaper to check with Python scalars than with batch masks
+            self.apply_pair_rules_single(logits, tokens)
+        else:
+            self.apply_pair_rules(logits, tokens)
 
         if tokens.shape[1] == self.sample_begin:
             # suppress generating non-timestamp tokens at the beginning
-            logits[:, : self.tokenizer.timestamp_begin] = -np.inf
+            logits[:, :timestamp_begin] = -np.inf
 
             # apply the `max_initial_timestamp` option
             if self.max_initial_timestamp_index is not None:
-                last_allowed = (
-                    self.tokenizer.timestamp_begin + self.max_initial_timestamp_index
-                )
+                last_allowed = timestamp_begin + self.max_initial_timestamp_index
                 logits[:, last_allowed + 1 :] = -np.inf
 
         # if sum of probability over timestamps is above any other token, sample timestamp
         logprobs = F.log_softmax(logits.float(), dim=-1)
-        for k in range(tokens.shape[0]):
-            timestamp_logprob = logprobs[k, self.tokenizer.timestamp_begin :].logsumexp(
-                dim=-1
-            )
-            max_text_token_logprob = logprobs[k, : self.tokenizer.timestamp_begin].max()
-            if timestamp_logprob > max_text_token_logprob:
-                logits[k, : self.tokenizer.timestamp_begin] = -np.inf
+        timestamp_logprob = logprobs[:, timestamp_begin:].logsumexp(dim=-1)
+        max_text_token_logprob = logprobs[:, :timestamp_begin].amax(dim=-1)
+        sample_timestamp = timestamp_logprob > max_text_token_logprob
+        if tokens.shape[0] == 1:
+            if sample_timestamp.item():
+                logits[:, :timestamp_begin] = -np.inf
+        else:
+            logits[:, :timestamp_begin] += self.row_mask(sample_timestamp, logits)
+
+    def apply_pair_rules_single(self, logits: Tensor, tokens: Tensor):
+        """The timestamp pairing and ordering rules for a batch of one sequence"""
+        timestamp_begin = self.tokenizer.timestamp_begin
+        seq = tokens[0, self.sample_begin :].tolist()
+        last_was_timestamp = len(seq) >= 1 and seq[-1] >= timestamp_begin
+        penultimate_was_timestamp = len(seq) < 2 or seq[-2] >= timestamp_begin
+
+        if last_was_timestamp:
+            if penultimate_was_timestamp:  # has to be non-timestamp
+                logits[0, timestamp_begin:] = -np.inf
+            else:  # cannot be normal text tokens
+                logits[0, : self.tokenizer.eot] = -np.inf
+
+        timestamps = [t for t in seq if t >= timestamp_begin]
+        if timestamps:
+            # timestamps shouldn't decrease; forbid timestamp tokens smaller than the last
+            # also force each segment to have a nonzero length, to prevent infinite looping
+            if last_was_timestamp and not penultimate_was_timestamp:
+                timestamp_last = timestamps[-1]
+            else:
+                timestamp_last = timestamps[-1] + 1
+            logits[0, timestamp_begin:timestamp_last] = -np.inf
+
+    def apply_pair_rules(self, logits: Tensor, tokens: Tensor):
+        """The timestamp pairing and ordering rules, for all sequences at once"""
+        timestamp_begin = self.tokenizer.timestamp_begin
+        sampled_tokens = tokens[:, self.sample_begin :]
+        if sampled_tokens.shape[1] == 0:
+            return
+
+        is_timestamp = sampled_tokens.ge(timestamp_begin)
+        last_was_timestamp = is_timestamp[:, -1]
+        if sampled_tokens.shape[1] >= 2:
+            penultimate_was_timestamp = is_timestamp[:, -2]
+        else:
+            penultimate_was_timestamp = torch.ones_like(last_was_timestamp)
+        after_pair = last_was_timestamp & penultimate_was_timestamp
+        after_single = last_was_timestamp & ~penultimate_was_timestamp
+
+        # has to be non-timestamp after a pair, and cannot be normal text after a single one
+        logits[:, timestamp_begin:] += self.row_mask(after_pair, logits)
+        logits[:, : self.tokenizer.eot] += self.row_mask(after_single, logits)
+
+        # timestamps shouldn't decrease; forbid timestamp tokens smaller than the last
+        # also force each segment to have a nonzero length, to prevent infinite looping
+        positions = torch.arange(1, sampled_tokens.shape[1] + 1, device=tokens.device)
+        last_position = (is_timestamp * positions).max(dim=-1).values - 1
+        timestamp_last = sampled_tokens.gather(1, last_position.clamp(min=0)[:, None])
+        timestamp_last = timestamp_last + (~after_single)[:, None]
+        timestamps = torch.arange(
+            timestamp_begin, logits.shape[-1], device=logits.device
+        )
+        logits[:, timestamp_begin:].masked_fill_(
+            (last_position >= 0)[:, None] & (timestamps < timestamp_last), -np.inf
+        )
+
+    @staticmethod
+    def row_mask(rows: Tensor, logits: Tensor) -> Tensor:
+        """
+        An additive (n_batch, 1) mask, -inf for the selected rows and 0 elsewhere;
+        adding it to a slice of the logits is cheaper than a masked fill over the slice
+        """
+        return logits.new_zeros(rows.shape[0], 1).masked_fill_(rows[:, None], -np.inf)
+
+
+@lru_cache(maxsize=None)
+def get_suppress_tokens(
+    multilingual: bool,
+    num_languages: int,
+    suppress_tokens: Optional[Union[str, Tuple[int, ...]]],
+) -> Tuple[int]:
+    """
+    The tokens to suppress for the `suppress_tokens` option, where -1 stands for the non-speech
+    tokens; memoized, since transcribe() creates a DecodingTask for every window and temperature
+    """
+    # the special and non-speech tokens do not depend on the language and the task
+    tokenizer = get_tokenizer(multilingual, num_languages=num_languages)
+
+    if isinstance(suppress_tokens, str):
+        suppress_tokens = [int(t) for t in suppress_tokens.split(",")]
+
+    if suppress_tokens is None or len(suppress_tokens) == 0:
+        suppress_tokens = []  # interpret empty string as an empty list
+    elif -1 in suppress_tokens:
+        suppress_tokens = [t for t in suppress_tokens if t >= 0]
+        suppress_tokens.extend(tokenizer.non_speech_tokens)
+    else:
+        suppress_tokens = list(suppress_tokens)
+
+    suppress_tokens.extend(
+        [
+            tokenizer.transcribe,
+            tokenizer.translate,
+            tokenizer.sot,
+            tokenizer.sot_prev,
+            tokenizer.sot_lm,
+        ]
+    )
+    if tokenizer.no_speech is not None:
+        # no-speech probability is collected separately
+        suppress_tokens.append(tokenizer.no_speech)
+
+    return tuple(sorted(set(suppress_tokens)))
 
 
 class DecodingTask:
@@ -537,7 +671,11 @@ class DecodingTask:
         self.sot_index: int = self.initial_tokens.index(tokenizer.sot)
 
         # inference: implements the forward pass through the decoder, including kv caching
-        self.inference = PyTorchInference(model, len(self.initial_tokens))
+        self.inference = PyTorchInference(
+            model,
+            len(self.initial_tokens),
+            min(len(self.initial_tokens) + self.sample_len, self.n_ctx),
+        )
 
         # sequence ranker: implements how to rank a group of sampled sequences
         self.sequence_ranker = MaximumLikelihoodRanker(options.length_penalty)
@@ -551,23 +689,41 @@ class DecodingTask:
             self.decoder = GreedyDecoder(options.temperature, tokenizer.eot)
 
         # logit filters: applies various rules to suppress or penalize certain tokens
-        self.logit_filters = []
+        self.logit_filters = self._get_logit_filters()
+
+    def _get_logit_filters(self) -> List[LogitFilter]:
+        logit_filters = []
         if self.options.suppress_blank:
-            self.logit_filters.append(SuppressBlank(self.tokenizer, self.sample_begin))
+            logit_filters.append(SuppressBlank(self.tokenizer, self.sample_begin))
         if self.options.suppress_tokens:
-            self.logit_filters.append(SuppressTokens(self._get_suppress_tokens()))
-        if not options.without_timestamps:
-            precision = CHUNK_LENGTH / model.dims.n_audio_ctx  # usually 0.02 seconds
+            logit_filters.append(SuppressTokens(self._get_suppress_tokens()))
+        if not self.options.without_timestamps:
+            precision = (
+                CHUNK_LENGTH / self.model.dims.n_audio_ctx
+            )  # usually 0.02 seconds
             max_initial_timestamp_index = None
-            if options.max_initial_timestamp:
+            if self.options.max_initial_timestamp:
                 max_initial_timestamp_index = round(
                     self.options.max_initial_timestamp / precision
                 )
-            self.logit_filters.append(
+            logit_filters.append(
                 ApplyTimestampRules(
-                    tokenizer, self.sample_begin, max_initial_timestamp_index
+                    self.tokenizer, self.sample_begin, max_initial_timestamp_index
                 )
             )
+        return logit_filters
+
+    def set_prompt(self, prompt: Optional[Union[str, List[int]]]):
+        """Change the prompt for the following runs, keeping everything else in place"""
+        if prompt == self.options.prompt:
+            return
+
+        self.options = replace(self.options, prompt=prompt)
+        self.initial_tokens = self._get_initial_tokens()
+        self.sample_begin = len(self.initial_tokens)
+        self.sot_index = self.initial_tokens.index(self.tokenizer.sot)
+        self.inference.initial_token_length = len(self.initial_tokens)
+        self.logit_filters = self._get_logit_filters()
 
     def _verify_options(self, options: DecodingOptions) -> DecodingOptions:
         if options.beam_size is not None and options.best_of is not None:
@@ -614,32 +770,12 @@ class DecodingTask:
 
     def _get_suppress_tokens(self) -> Tuple[int]:
         suppress_tokens = self.options.suppress_tokens
+        if isinstance(suppress_tokens, list):
+            suppress_tokens = tuple(suppress_tokens)
 
-        if isinstance(suppress_tokens, str):
-            suppress_tokens = [int(t) for t in suppress_tokens.split(",")]
-
-        if -1 in suppress_tokens:
-            suppress_tokens = [t for t in suppress_tokens if t >= 0]
-            suppress_tokens.extend(self.tokenizer.non_speech_tokens)
-        elif suppress_tokens is None or len(suppress_tokens) == 0:
-            suppress_tokens = []  # interpret empty string as an empty list
-        else:
-            assert isinstance(suppress_tokens, list), "suppress_tokens must be a list"
-
-        suppress_tokens.extend(
-            [
-                self.tokenizer.transcribe,
-                self.tokenizer.translate,
-                self.tokenizer.sot,
-                self.tokenizer.sot_prev,
-                self.tokenizer.sot_lm,
-            ]
+        return get_suppress_tokens(
+            self.model.is_multilingual, self.model.num_languages, suppress_tokens
         )
-        if self.tokenizer.no_speech is not None:
-            # no-speech probability is collected separately
-            suppress_tokens.append(self.tokenizer.no_speech)
-
-        return tuple(sorted(set(suppress_tokens)))
 
     def _get_audio_features(self, mel: Tensor):
         if self.options.fp16:
@@ -652,7 +788,7 @@ class DecodingTask:
             # encoded audio features are given; skip audio encoding
             audio_features = mel
         else:
-            audio_features = self.model.encoder(mel)
+            audio_features = self.model.embed_audio(mel)
 
         if audio_features.dtype != (
             torch.float16 if self.options.fp16 else torch.float32
@@ -733,11 +869,15 @@ class DecodingTask:
         # repeat text tensors by the group size, for beam search or best-of-n sampling
         tokens = tokens.repeat_interleave(self.n_group, dim=0).to(audio_features.device)
 
+        # a single audio input broadcasts over the group; a batch needs one copy per sequence
+        group_features = audio_features
+        if n_audio > 1 and self.n_group > 1:
+            group_features = audio_features.repeat_interleave(self.n_group, dim=0)
+
         # call the main sampling loop
-        tokens, sum_logprobs, no_speech_probs = self._main_loop(audio_features, tokens)
+        tokens, sum_logprobs, no_speech_probs = self._main_loop(group_features, tokens)
 
         # reshape the tensors to have (n_audio, n_group) as the first two dimensions
-        audio_features = audio_features[:: self.n_group]
         no_speech_probs = no_speech_probs[:: self.n_group]
         assert audio_features.shape[0] == len(no_speech_probs) == n_audio
 
@@ -789,6 +929,167 @@ class DecodingTask:
         ]
 
 
+class SpeculativeDecodingTask(DecodingTask):
+    """
+    Greedy decoding assisted by a smaller draft model that shares the tokenizer: the draft model
+    proposes up to `num_draft_tokens` tokens, which the main model verifies in a single forward
+    pass. The longest prefix that agrees with the main model's own greedy choices is kept, plus the
+    main model's choice at the first disagreement, so the tokens are those of greedy decoding.
+    """
+
+    def __init__(
+        self,
+        model: "Whisper",
+        draft_model: "Whisper",
+        options: DecodingOptions,
+        num_draft_tokens: int = 4,
+    ):
+        super().__init__(model, options)
+
+        if self.options.temperature != 0 or self.n_group != 1:
+            raise ValueError("speculative decoding requires greedy decoding (T=0)")
+        if draft_model is model:
+            raise ValueError("the draft model must be a separate model instance")
+        if (
+            draft_model.dims.n_vocab != model.dims.n_vocab
+            or draft_model.num_languages != model.num_languages
+        ):
+            raise ValueError("the draft model must use the same tokenizer as the model")
+        if num_draft_tokens < 1:
+            raise ValueError("num_draft_tokens should be at least 1")
+
+        self.draft_model = draft_model
+        self.num_draft_tokens = num_draft_tokens
+        self.draft_inference = PyTorchInference(
+            draft_model, len(self.initial_tokens), self.inference.max_length
+        )
+        self.draft_audio_features: Optional[Tensor] = None
+
+    def _main_loop(self, audio_features: Tensor, tokens: Tensor):
+        n_batch = tokens.shape[0]
+        sum_logprobs: Tensor = torch.zeros(n_batch, device=audio_features.device)
+        draft_logprobs: Tensor = torch.zeros(n_batch, device=audio_features.device)
+        no_speech_probs = [np.nan] * n_batch
+
+        try:
+            i = 0  # the number of tokens sampled so far
+            completed = False
+            while i < self.sample_len and not completed:
+                # propose tokens with the draft model, leaving room for the main model's own token
+                draft = tokens
+                for _ in range(min(self.num_draft_tokens, self.sample_len - i - 1)):
+                    logits = self.draft_inference.logits(
+                        draft, self.draft_audio_features
+                    )[:, -1]
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(logits, draft)
+                    draft, _ = self.decoder.update(draft, logits, draft_logprobs)
+
+                # verify all proposed tokens in one forward pass of the main model
+                n_draft = draft.shape[-1] - tokens.shape[-1]
+                logits = self.inference.logits(draft, audio_features)
+
+                if (
+                    i == 0 and self.tokenizer.no_speech is not None
+                ):  # save no_speech_probs
+                    probs_at_sot = logits[:, self.sot_index].float().softmax(dim=-1)
+                    no_speech_probs = probs_at_sot[:, self.tokenizer.no_speech].tolist()
+
+                for logits in logits[:, -(n_draft + 1) :].unbind(dim=1):
+                    for logit_filter in self.logit_filters:
+                        logit_filter.apply(logits, tokens)
+
+                    tokens, completed = self.decoder.update(
+                        tokens, logits, sum_logprobs
+                    )
+                    i += 1
+
+                    if completed or tokens.shape[-1] > self.n_ctx:
+                        completed = True
+                        break
+
+                    # the later logits are only valid while every proposal was accepted
+                    length = tokens.shape[-1]
+                    if length > draft.shape[-1] or not torch.equal(
+                        tokens[:, -1], draft[:, length - 1]
+                    ):
+                        break
+
+                # keep the cached keys and values of the accepted tokens only
+                self.inference.truncate_kv_cache(tokens.shape[-1] - 1)
+                self.draft_inference.truncate_kv_cache(tokens.shape[-1] - 1)
+        finally:
+            self.inference.cleanup_caching()
+            self.draft_inference.cleanup_caching()
+
+        return tokens, sum_logprobs, no_speech_probs
+
+    @torch.no_grad()
+    def run(self, mel: Tensor) -> List[DecodingResult]:
+        if mel.shape[-2] != self.draft_model.dims.n_mels:
+            raise ValueError(
+                f"the draft model needs a Mel spectrogram with {self.draft_model.dims.n_mels} bins"
+            )
+        if self.options.fp16:
+            mel = mel.half()
+        self.draft_audio_features = self.draft_model.embed_audio(mel)
+
+        try:
+            return super().run(mel)
+        finally:
+            self.draft_audio_features = None
+
+
+class DecodingSession:
+    """
+    Decodes many 30-second segments with the same options, such as the windows of `transcribe()`,
+    reusing one `DecodingTask`: only the mel spectrogram and the prompt change between calls.
+
+    The kv-cache hooks are installed on the first call and stay installed, inactive between calls,
+    until `close()` is called; the kv cache is preallocated for the whole text context.
+    """
+
+    def __init__(
+        self,
+        model: "Whisper",
+        options: DecodingOptions = DecodingOptions(),
+        **kwargs,
+    ):
+        if kwargs:
+            options = replace(options, **kwargs)
+
+        self.task = DecodingTask(model, options)
+        self.task.inference = PyTorchInference(
+            model, len(self.task.initial_tokens), self.task.n_ctx, persistent=True
+        )
+        if isinstance(self.task.decoder, BeamSearchDecoder):
+            self.task.decoder.inference = self.task.inference
+
+    @torch.no_grad()
+    def decode(
+        self, mel: Tensor, prompt: Optional[Union[str, List[int]]] = None
+    ) -> Union[DecodingResult, List[DecodingResult]]:
+        """
+        Decode 30-second audio segment(s) like `decode()`, with `prompt` replacing `options.prompt`
+        """
+        if single := mel.ndim == 2:
+            mel = mel.unsqueeze(0)
+
+        self.task.set_prompt(prompt)
+        result = self.task.run(mel)
+
+        return result[0] if single else result
+
+    def close(self):
+        self.task.inference.remove_hooks()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 @torch.no_grad()
 def decode(
     model: "Whisper",
@@ -824,3 +1125,114 @@ def decode(
     result = DecodingTask(model, options).run(mel)
 
     return result[0] if single else result
+
+
+@torch.no_grad()
+def decode_temperatures(
+    model: "Whisper",
+    mel: Tensor,
+    temperatures: Sequence[float],
+    options: DecodingOptions = DecodingOptions(),
+    **kwargs,
+) -> List[List[DecodingResult]]:
+    """
+    Decodes 30-second audio segment(s) at several sampling temperatures in a single batched pass,
+    by extending the batch with one copy of each audio per temperature.
+
+    Parameters
+    ----------
+    model: Whisper
+        the Whisper model instance
+
+    mel: torch.Tensor, shape = (80, 3000) or (*, 80, 3000)
+        A tensor containing the Mel spectrogram(s), or the already-encoded audio features
+
+    temperatures: Sequence[float]
+        The temperatures to decode at; 0 means greedy decoding. Beam search cannot be combined
+        with sampling, so `options.beam_size` is only allowed if all temperatures are 0
+
+    options: DecodingOptions
+        A dataclass that contains all other options for decoding 30-second segments
+
+    Returns
+    -------
+    result: List[List[DecodingResult]]
+        The results for each audio, in the order of `temperatures`
+    """
+    if mel.ndim == 2:
+        mel = mel.unsqueeze(0)
+
+    if kwargs:
+        options = replace(options, **kwargs)
+    options = replace(options, temperature=max(temperatures))
+
+    task = DecodingTask(model, options)
+    audio_features = task._get_audio_features(mel)
+    n_audio, n_temperatures = audio_features.shape[0], len(temperatures)
+
+    per_sequence = torch.tensor(temperatures, device=audio_features.device)
+    per_sequence = per_sequence.repeat(n_audio).repeat_interleave(task.n_group)
+    if options.beam_size is None:
+        task.decoder = GreedyDecoder(per_sequence, task.tokenizer.eot)
+    elif per_sequence.any():
+        raise ValueError("beam search cannot be combined with sampling temperatures")
+
+    results = task.run(audio_features.repeat_interleave(n_temperatures, dim=0))
+
+    return [
+        [
+            replace(result, temperature=t)
+            for result, t in zip(results[i * n_temperatures :], temperatures)
+        ]
+        for i in range(n_audio)
+    ]
+
+
+@torch.no_grad()
+def decode_speculative(
+    model: "Whisper",
+    draft_model: "Whisper",
+    mel: Tensor,
+    options: DecodingOptions = DecodingOptions(),
+    num_draft_tokens: int = 4,
+    **kwargs,
+) -> Union[DecodingResult, List[DecodingResult]]:
+    """
+    Performs greedy decoding of 30-second audio segment(s) like `decode()`, with a smaller draft
+    model proposing tokens that the main model verifies several at a time.
+
+    Parameters
+    ----------
+    model: Whisper
+        the Whisper model instance
+
+    draft_model: Whisper
+        a smaller Whisper model with the same tokenizer and number of Mel bins, e.g. "tiny" for
+        "medium"
+
+    mel: torch.Tensor, shape = (80, 3000) or (*, 80, 3000)
+        A tensor containing the Mel spectrogram(s)
+
+    options: DecodingOptions
+        A dataclass that contains all necessary options for decoding 30-second segments; the
+        temperature must be 0, and beam search is not supported
+
+    num_draft_tokens: int
+        The maximum number of tokens proposed by the draft model for each forward pass of the
+        main model
+
+    Returns
+    -------
+    result: Union[DecodingResult, List[DecodingResult]]
+        The result(s) of decoding contained in `DecodingResult` dataclass instance(s)
+    """
+    if single := mel.ndim == 2:
+        mel = mel.unsqueeze(0)
+
+    if kwargs:
+        options = replace(options, **kwargs)
+
+    task = SpeculativeDecodingTask(model, draft_model, options, num_draft_tokens)
+    result = task.run(mel)
+
+    return result[0] if single else result
@@ -1,8 +1,11 @@
 import base64
 import gzip
+import hashlib
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Dict, Iterable, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
 
 import numpy as np
 import torch
@@ -13,6 +16,13 @@ from .decoding import decode as decode_function
 from .decoding import detect_language as detect_language_function
 from .transcribe import transcribe as transcribe_function
 
+try:
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.ao.quantization import per_channel_dynamic_qconfig
+except ImportError:  # PyTorch < 1.13
+    from torch.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from torch.quantization import per_channel_dynamic_qconfig
+
 try:
     from torch.nn.functional import scaled_dot_product_attention
 
@@ -50,6 +60,27 @@ class Linear(nn.Linear):
         )
 
 
+class QuantizedLinear(nn.Module):
+    """
+    A Linear layer with int8 weights, computed with PyTorch's dynamic quantization kernels, which
+    quantize the activations on the fly. CPU only; the input and output keep the caller's dtype.
+    """
+
+    def __init__(self, linear: nn.Linear):
+        super().__init__()
+        float_linear = nn.Linear(
+            linear.in_features, linear.out_features, linear.bias is not None
+        )
+        float_linear.weight.data = linear.weight.detach().float().cpu()
+        if linear.bias is not None:
+            float_linear.bias.data = linear.bias.detach().float().cpu()
+        float_linear.qconfig = per_channel_dynamic_qconfig
+        self.linear = DynamicQuantizedLinear.from_float(float_linear)
+
+    def forward(self, x: Tensor) -> Tensor:
+        return self.linear(x.float()).to(x.dtype)
+
+
 class Conv1d(nn.Conv1d):
     def _conv_forward(
         self, x: Tensor, weight: Tensor, bias: Optional[Tensor]
@@ -78,6 +109,40 @@ def disable_sdpa():
         MultiHeadAttention.use_sdpa = prev_state
 
 
+# the attention modules and heads whose weights are captured, per thread; see capture_attention()
+_attention_capture = threading.local()
+
+
+@contextmanager
+def capture_attention(
+    heads: Dict["MultiHeadAttention", Tensor],
+) -> Iterator[Dict["MultiHeadAttention", Tensor]]:
+    """
+    Capture the pre-softmax attention weights (QK) of some heads in the current thread, while the
+    other heads, modules and threads keep using scaled_dot_product_attention.
+
+    Parameters
+    ----------
+    heads: Dict[MultiHeadAttention, Tensor]
+        Maps each attention module to capture to the indices of its heads to capture
+
+    Returns
+    -------
+    A dictionary that is filled with the weights of the latest forward pass of each module, of
+    shape (n_batch, len(heads[module]), n_ctx, n_kv_ctx), as float32 tensors
+    """
+    previous = getattr(_attention_capture, "heads", None)
+    previous_weights = getattr(_attention_capture, "weights", None)
+    weights = {}
+    _attention_capture.heads = heads
+    _attention_capture.weights = weights
+    try:
+        yield weights
+    finally:
+        _attention_capture.heads = previous
+        _attention_capture.weights = previous_weights
+
+
 class MultiHeadAttention(nn.Module):
     use_sdpa = True
 
@@ -108,33 +173,57 @@ class MultiHeadAttention(nn.Module):
             k = kv_cache[self.key]
             v = kv_cache[self.value]
 
-        wv, qk = self.qkv_attention(q, k, v, mask)
+        capture = getattr(_attention_capture, "heads", None)
+        heads = capture.get(self) if capture else None
+        wv, qk = self.qkv_attention(q, k, v, mask, heads)
+        if heads is not None:
+            _attention_capture.weights[self] = qk
         return self.out(wv), qk
 
     def qkv_attention(
-        self, q: Tensor, k: Tensor, v: Tensor, mask: Optional[Tensor] = None
+        self,
+        q: Tensor,
+        k: Tensor,
+        v: Tensor,
+        mask: Optional[Tensor] = None,
+        heads: Optional[Tensor] = None,
     ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+        """
+        Returns the attention output and, unless SDPA is used, the pre-softmax weights of all heads;
+        if `heads` is given, the weights of these heads are computed and returned in any case.
+        """
         n_batch, n_ctx, n_state = q.shape
         scale = (n_state // self.n_head) ** -0.25
+        # with a kv cache, the queries are the last n_ctx of the key positions
+        offset = k.shape[1] - n_ctx
         q = q.view(*q.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
         k = k.view(*k.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
         v = v.view(*v.shape[:2], self.n_head, -1).permute(0, 2, 1, 3)
 
         if SDPA_AVAILABLE and MultiHeadAttention.use_sdpa:
-            a = scaled_dot_product_attention(
-                q, k, v, is_causal=mask is not None and n_ctx > 1
-            )
+            if mask is not None and n_ctx > 1 and offset > 0:
+                attn_mask = mask[offset : offset + n_ctx, : k.shape[2]].to(q.dtype)
+                a = scaled_dot_product_attention(q, k, v, attn_mask=attn_mask)
+            else:
+                a = scaled_dot_product_attention(
+                    q, k, v, is_causal=mask is not None and n_ctx > 1
+                )
             out = a.permute(0, 2, 1, 3).flatten(start_dim=2)
             qk = None
+            if heads is not None:
+                qk = (q[:, heads] * scale) @ (k[:, heads] * scale).transpose(-1, -2)
+                if mask is not None:
+                    qk = qk + mask[offset : offset + n_ctx, : k.shape[2]]
+                qk = qk.float().detach()
         else:
             qk = (q * scale) @ (k * scale).transpose(-1, -2)
             if mask is not None:
-                qk = qk + mask[:n_ctx, :n_ctx]
+                qk = qk + mask[offset : offset + n_ctx, : k.shape[2]]
             qk = qk.float()
 
             w = F.softmax(qk, dim=-1).to(q.dtype)
             out = (w @ v).permute(0, 2, 1, 3).flatten(start_dim=2)
-            qk = qk.detach()
+            qk = qk.detach() if heads is None else qk[:, heads].detach()
 
         return out, qk
 
@@ -221,7 +310,8 @@ class TextDecoder(nn.Module):
         )
         self.ln = LayerNorm(n_state)
 
-        mask = torch.empty(n_ctx, n_ctx).fill_(-np.inf).triu_(1)
+        # not part of the state dict, so it is created on the CPU even on the meta device
+        mask = torch.empty(n_ctx, n_ctx, device="cpu").fill_(-np.inf).triu_(1)
         self.register_buffer("mask", mask, persistent=False)
 
     def forward(self, x: Tensor, xa: Tensor, kv_cache: Optional[dict] = None):
@@ -249,6 +339,52 @@ class TextDecoder(nn.Module):
         return logits
 
 
+class AudioFeaturesCache:
+    """
+    An LRU cache of encoder outputs keyed by a hash of the input mel spectrogram, so that decoding
+    the same audio again, e.g. with a different language, prompt or task, skips the encoder.
+    Enable it with `model.audio_features_cache = AudioFeaturesCache(maxsize)`; each entry holds
+    one (n_audio_ctx, n_audio_state) tensor on the model's device.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[str, Tensor]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(mel: Tensor) -> str:
+        data = mel.detach().cpu().contiguous().numpy().tobytes()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        return f"{digest}-{tuple(mel.shape)}-{mel.dtype}"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_or_compute(self, mel: Tensor, encoder: Callable[[Tensor], Tensor]):
+        """Encode the batch `mel` with `encoder`, reusing the cached rows where possible"""
+        keys = [self.key(m) for m in mel]
+        with self.lock:
+            features = [self.entries.get(key) for key in keys]
+            for key, feature in zip(keys, features):
+                if feature is not None:
+                    self.entries.move_to_end(key)
+
+        if missing := [i for i, feature in enumerate(features) if feature is None]:
+            for i, feature in zip(missing, encoder(mel[missing])):
+                features[i] = feature
+                with self.lock:
+                    self.entries[keys[i]] = feature
+                    while len(self.entries) > self.maxsize:
+                        self.entries.popitem(last=False)
+
+        return torch.stack(features)
+
+
 class Whisper(nn.Module):
     def __init__(self, dims: ModelDimensions):
         super().__init__()
@@ -269,11 +405,17 @@ class Whisper(nn.Module):
         )
         # use the last half among the decoder layers for time alignment by default;
         # to use a specific set of heads, see `set_alignment_heads()` below.
+        # like the decoder's mask, it is created on the CPU even on the meta device
         all_heads = torch.zeros(
-            self.dims.n_text_layer, self.dims.n_text_head, dtype=torch.bool
+            self.dims.n_text_layer,
+            self.dims.n_text_head,
+            dtype=torch.bool,
+            device="cpu",
         )
         all_heads[self.dims.n_text_layer // 2 :] = True
         self.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+        # optional cache of encoder outputs used by `embed_audio()`; see `AudioFeaturesCache`
+        self.audio_features_cache: Optional[AudioFeaturesCache] = None
 
     def set_alignment_heads(self, dump: bytes):
         array = np.frombuffer(
@@ -284,8 +426,30 @@ class Whisper(nn.Module):
         )
         self.register_buffer("alignment_heads", mask.to_sparse(), persistent=False)
 
+    def quantize(self, dtype: str = "int8") -> "Whisper":
+        """
+        Replace the Linear layers of the encoder and the decoder with dynamically quantized int8
+        layers, for faster inference on the CPU. The convolutions, layer norms, embeddings and the
+        output projection onto the vocabulary stay in floating point. Modifies the model in place.
+        """
+        if dtype != "int8":
+            raise ValueError(f"Unsupported quantization dtype: {dtype}")
+        if self.device != torch.device("cpu"):
+            raise ValueError("Quantized models can only run on the CPU")
+        if torch.backends.quantized.engine == "none":
+            raise RuntimeError("This PyTorch build has no quantized CPU backend")
+
+        for module in list(self.modules()):
+            for name, child in module.named_children():
+                if isinstance(child, Linear):
+                    setattr(module, name, QuantizedLinear(child))
+
+        return self
+
     def embed_audio(self, mel: torch.Tensor):
-        return self.encoder(mel)
+        if self.audio_features_cache is None:
+            return self.encoder(mel)
+        return self.audio_features_cache.get_or_compute(mel, self.encoder)
 
     def logits(self, tokens: torch.Tensor, audio_features: torch.Tensor):
         return self.decoder(tokens, audio_features)
@@ -293,7 +457,7 @@ class Whisper(nn.Module):
     def forward(
         self, mel: torch.Tensor, tokens: torch.Tensor
     ) -> Dict[str, torch.Tensor]:
-        return self.decoder(tokens, self.encoder(mel))
+        return self.decoder(tokens, self.embed_audio(mel))
 
     @property
     def device(self):
@@ -307,13 +471,26 @@ class Whisper(nn.Module):
     def num_languages(self):
         return self.dims.n_vocab - 51765 - int(self.is_multilingual)
 
-    def install_kv_cache_hooks(self, cache: Optional[dict] = None):
+    def install_kv_cache_hooks(
+        self,
+        cache: Optional[dict] = None,
+        max_length: Optional[int] = None,
+        enabled: Optional[Callable[[], bool]] = None,
+    ):
         """
         The `MultiHeadAttention` module optionally accepts `kv_cache` which stores the key and value
         tensors calculated for the previous positions. This method returns a dictionary that stores
         all caches, and the necessary hooks for the key and value projection modules that save the
         intermediate tensors to be reused during later calculations.
 
+        If `max_length` is given, the self-attention caches are preallocated with room for that
+        many positions on the first forward pass, and each step is written in place at the current
+        offset; the dictionary then holds views of the buffers covering the positions filled so far.
+        The buffers are reused when the cache is cleared and filled again with the same batch size.
+
+        If `enabled` is given, the hooks only act while it returns True, so that they can stay
+        installed between decoding runs without affecting other forward passes.
+
         Returns
         -------
         cache : Dict[nn.Module, torch.Tensor]
@@ -322,9 +499,12 @@ class Whisper(nn.Module):
             List of PyTorch RemovableHandle objects to stop the hooks to be called
         """
         cache = {**cache} if cache is not None else {}
+        buffers = {}
         hooks = []
 
         def save_to_cache(module, _, output):
+            if enabled is not None and not enabled():
+                return None
             if module not in cache or output.shape[1] > self.dims.n_text_ctx:
                 # save as-is, for the first token or cross attention
                 cache[module] = output
@@ -332,10 +512,34 @@ class Whisper(nn.Module):
                 cache[module] = torch.cat([cache[module], output], dim=1).detach()
             return cache[module]
 
+        def save_to_static_cache(module, _, output):
+            if enabled is not None and not enabled():
+                return None
+            if output.shape[1] > self.dims.n_text_ctx:
+                # cross attention is computed once and saved as-is
+                cache[module] = output
+                return output
+
+            offset = cache[module].shape[1] if module in cache else 0
+            shape = (output.shape[0], max_length, output.shape[2])
+            buffer = buffers.get(module)
+            if offset == 0 and (
+                buffer is None
+                or buffer.shape != shape
+                or buffer.dtype != output.dtype
+                or buffer.device != output.device
+            ):
+                buffers[module] = output.new_empty(shape)
+            end = offset + output.shape[1]
+            buffers[module][:, offset:end] = output.detach()
+            cache[module] = buffers[module][:, :end]
+            return cache[module]
+
         def install_hooks(layer: nn.Module):
             if isinstance(layer, MultiHeadAttention):
-                hooks.append(layer.key.register_forward_hook(save_to_cache))
-                hooks.append(layer.value.register_forward_hook(save_to_cache))
+                hook = save_to_cache if max_length is None else save_to_static_cache
+                hooks.append(layer.key.register_forward_hook(hook))
+                hooks.append(layer.value.register_forward_hook(hook))
 
         self.decoder.apply(install_hooks)
         return cache, hooks
@@ -0,0 +1,333 @@
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import torch
+
+from .audio import load_audio
+from .model import AudioFeaturesCache
+from .transcribe import encode_first_windows, transcribe
+
+if TYPE_CHECKING:
+    from .model import Whisper
+
+
+@dataclass
+class Job:
+    audio: Union[str, np.ndarray]
+    model: str
+    options: dict
+    # messages for the client: {"segments": [...]}, then {"result": {...}} or {"error": "..."}
+    messages: "queue.Queue[dict]" = field(default_factory=queue.Queue)
+    done: bool = False
+
+    def put_segments(self, segments: List[dict]):
+        self.messages.put({"segments": segments})
+
+    def put_result(self, result: dict):
+        self.done = True
+        self.messages.put({"result": result})
+
+    def put_error(self, e: BaseException):
+        self.done = True
+        self.messages.put({"error": f"{type(e).__name__}: {str(e)}"})
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            message = self.messages.get()
+            yield message
+            if "segments" not in message:
+                return
+
+
+class TranscriptionServer:
+    """
+    Keeps Whisper models loaded and transcribes the submitted jobs on a single worker thread.
+
+    Jobs that are waiting when the worker becomes free are processed together: the first 30-second
+    windows of all jobs that use the same model and precision are encoded in one batch, and the
+    jobs are then decoded one after another, streaming each window's segments as they are final.
+    """
+
+    def __init__(
+        self,
+        default_model: str = "turbo",
+        device: Optional[Union[str, torch.device]] = None,
+        download_root: Optional[str] = None,
+        max_batch_size: int = 8,
+    ):
+        self.default_model = default_model
+        self.device = device
+        self.download_root = download_root
+        self.max_batch_size = max_batch_size
+        self.models: Dict[str, "Whisper"] = {}
+        self.jobs: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def load_model(self, name: str) -> "Whisper":
+        if name not in self.models:
+            from . import load_model
+
+            model = load_model(name, self.device, self.download_root, warm_up=True)
+            model.audio_features_cache = AudioFeaturesCache(2 * self.max_batch_size)
+            self.models[name] = model
+        return self.models[name]
+
+    def submit(
+        self, audio: Union[str, np.ndarray], model: Optional[str] = None, **options
+    ) -> Job:
+        """
+        Queue a transcription of `audio` with the given `transcribe()` options, and return the job,
+        which can be iterated over to receive its segments and result
+        """
+        job = Job(audio, model or self.default_model, options)
+        self.jobs.put(job)
+        return job
+
+    def close(self):
+        self.jobs.put(None)
+        self.worker.join()
+
+    def _run(self):
+        while (job := self.jobs.get()) is not None:
+            batch = [job]
+            while len(batch) < self.max_batch_size:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.jobs.put(None)  # stop once this batch is done
+                    break
+                batch.append(job)
+
+            groups = defaultdict(list)
+            for job in batch:
+                try:
+                    groups[job.model, job.options.get("fp16", True)].append(job)
+                except Exception as e:  # e.g. an unhashable option value
+                    job.put_error(e)
+            for jobs in groups.values():
+                try:
+                    self._transcribe(jobs)
+                except Exception as e:
+                    # the worker must survive, or every waiting client would block forever
+                    traceback.print_exc()
+                    for job in jobs:
+                        if not job.done:
+                            job.put_error(e)
+
+    def _transcribe(self, jobs: List[Job]):
+        try:
+            model = self.load_model(jobs[0].model)
+        except Exception as e:
+            traceback.print_exc()
+            for job in jobs:
+                job.put_error(e)
+            return
+
+        audios = []
+        for job in jobs:
+            try:
+                if isinstance(job.audio, str):
+                    job.audio = load_audio(job.audio)
+                audios.append(job)
+            except Exception as e:
+                job.put_error(e)
+
+        try:
+            if len(audios) > 1:
+                fp16 = audios[0].options.get("fp16", True)
+                dtype = torch.float16 if fp16 else torch.float32
+                if model.device == torch.device("cpu"):
+                    dtype = torch.float32
+                detect_language = model.is_multilingual and any(
+                    job.options.get("language") is None for job in audios
+                )
+                try:
+                    encode_first_windows(
+                        model, [job.audio for job in audios], dtype, detect_language
+                    )
+                except Exception as e:
+                    traceback.print_exc()
+                    for job in audios:
+                        job.put_error(e)
+                    return
+
+            for job in audios:
+                try:
+                    result = transcribe(
+                        model,
+                        job.audio,
+                        segment_callback=job.put_segments,
+                        **{"verbose": None, **job.options},
+                    )
+                    job.put_result(result)
+                except Exception as e:
+                    traceback.print_exc()
+                    job.put_error(e)
+        finally:
+            model.audio_features_cache.clear()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles `POST /transcribe` with a JSON body {"audio": path, "model": name, "options": {...}},
+    and responds with one JSON message per line as the transcription progresses
+    """
+
+    server: "Union[HTTPServer, UnixHTTPServer]"
+
+    def do_POST(self):
+        if self.path != "/transcribe":
+            self.send_error(404)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            audio = request["audio"]
+            model = request.get("model")
+            options = request.get("options", {})
+            job = self.server.transcription_server.submit(audio, model, **options)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error(400, f"Invalid request: {e}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for message in job:
+            self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, transcription_server: TranscriptionServer):
+        super().__init__(address, RequestHandler)
+        self.transcription_server = transcription_server
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, transcription_server: TranscriptionServer):
+        if os.path.exists(path):
+            # replace a stale socket from a previous run, but never delete another kind of file
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                raise FileExistsError(f"{path} exists and is not a socket")
+            os.remove(path)
+        super().__init__(path, RequestHandler)
+        self.transcription_server = transcription_server
+
+    def get_request(self):
+        # Unix socket clients have no address, which the request handler's logging expects
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request_transcription(
+    address: str, audio: str, model: Optional[str] = None, **options
+) -> Iterator[dict]:
+    """
+    Send a transcription job to a running `whisper serve` and yield its messages: zero or more
+    {"segments": [...]} while decoding, then {"result": {...}} as returned by `transcribe()`
+
+    Parameters
+    ----------
+    address: str
+        "host:port" of the HTTP server, or the path of its Unix socket
+
+    audio: str
+        The path to the audio file, as seen by the server
+
+    model: Optional[str]
+        The model to use; defaults to the server's default model
+
+    options: dict
+        Keyword arguments to `transcribe()`
+    """
+    if os.path.exists(address):
+        connection = UnixHTTPConnection(address)
+    else:
+        connection = http.client.HTTPConnection(address)
+
+    try:
+        body = json.dumps({"audio": audio, "model": model, "options": options})
+        connection.request(
+            "POST", "/transcribe", body, {"Content-Type": "application/json"}
+        )
+        response = connection.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"Transcription request failed: {response.reason}")
+        for line in response:
+            message = json.loads(line)
+            if "error" in message:
+                raise RuntimeError(f"Transcription failed: {message['error']}")
+            yield message
+    finally:
+        connection.close()
+
+
+def cli():
+    from . import available_models
+
+    # fmt: off
+    parser = argparse.ArgumentParser(prog="whisper serve", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--model", default="turbo", help="name of the Whisper model used by requests that do not specify one")
+    parser.add_argument("--preload", nargs="*", default=None, help=f"models to load at startup, out of {available_models()} or checkpoint paths; defaults to --model")
+    parser.add_argument("--model_dir", type=str, default=None, help="the path to save model files; uses ~/.cache/whisper by default")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu", help="device to use for PyTorch inference")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--socket", type=str, default=None, help="listen on this Unix socket path instead of --host and --port")
+    parser.add_argument("--max_batch_size", type=int, default=8, help="maximum number of waiting requests whose audio is encoded together")
+    # fmt: on
+
+    args = parser.parse_args()
+    transcription_server = TranscriptionServer(
+        args.model, args.device, args.model_dir, args.max_batch_size
+    )
+    for name in args.preload if args.preload is not None else [args.model]:
+        transcription_server.load_model(name)
+
+    if args.socket is not None:
+        server = UnixHTTPServer(args.socket, transcription_server)
+        print(f"Listening on {args.socket}")
+    else:
+        server = HTTPServer((args.host, args.port), transcription_server)
+        print(f"Listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        transcription_server.close()
@@ -0,0 +1,316 @@
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from .audio import (
+    HOP_LENGTH,
+    N_FFT,
+    N_FRAMES,
+    SAMPLE_RATE,
+    _log_mel_frames,
+    pad_or_trim,
+)
+from .decoding import DecodingOptions, DecodingResult, DecodingSession
+from .tokenizer import Tokenizer, get_tokenizer
+from .utils import exact_div
+
+if TYPE_CHECKING:
+    from .model import Whisper
+
+
+class StreamingTranscriber:
+    """
+    Transcribes audio as it arrives, e.g. from a microphone, using a LocalAgreement policy
+
+    The audio since the last committed segment is kept as a rolling buffer of log-Mel frames, and
+    re-decoded whenever `min_chunk_length` seconds of new audio have been inserted. A segment is
+    committed once two consecutive decodings agree on it, then reported through `on_final` and cut
+    from the buffer; the rest of the latest decoding is reported through `on_partial`, and may
+    still change.
+
+    `insert_audio()` runs the model, so it should be called from a worker thread rather than from
+    an audio callback. The decoding session installs hooks on the model until `finish()` or
+    `close()` is called; the transcriber can also be used as a context manager.
+    """
+
+    def __init__(
+        self,
+        model: "Whisper",
+        *,
+        on_partial: Optional[Callable[[dict], None]] = None,
+        on_final: Optional[Callable[[dict], None]] = None,
+        min_chunk_length: float = 1.0,
+        max_buffer_length: float = 20.0,
+        no_speech_threshold: Optional[float] = 0.6,
+        logprob_threshold: Optional[float] = -1.0,
+        **decode_options,
+    ):
+        """
+        Parameters
+        ----------
+        model: Whisper
+            The Whisper model instance
+
+        on_partial: Optional[Callable[[dict], None]]
+            Called after each decoding with the uncommitted text, as a segment dictionary with
+            "start", "end", "text" and "tokens"
+
+        on_final: Optional[Callable[[dict], None]]
+            Called with each committed segment, a dictionary with "id", "start", "end", "text" and
+            "tokens" like the segments of `transcribe()`
+
+        min_chunk_length: float
+            The amount of new audio in seconds that triggers a decoding of the buffer
+
+        max_buffer_length: float
+            Once the buffer is longer than this many seconds, its complete segments are committed
+            without waiting for agreement; must be less than 30 seconds
+
+        no_speech_threshold: Optional[float]
+            If the no_speech probability is higher than this value and the average log probability
+            is below `logprob_threshold`, the buffer is considered silent
+
+        logprob_threshold: Optional[float]
+            See `no_speech_threshold`
+
+        decode_options: dict
+            Keyword arguments to construct `DecodingOptions`; decoding is always greedy
+        """
+        if not 0 < max_buffer_length < 30 - min_chunk_length:
+            raise ValueError(
+                "max_buffer_length must leave room for a chunk in 30 seconds"
+            )
+
+        self.model = model
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.min_chunk_length = min_chunk_length
+        self.max_buffer_length = max_buffer_length
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+
+        if model.device == torch.device("cpu"):
+            decode_options["fp16"] = False
+        self.decode_options = {**decode_options, "temperature": 0.0}
+        self.decode_options.pop("prompt", None)
+        self.session: Optional[DecodingSession] = None
+        self.tokenizer: Optional[Tokenizer] = None
+
+        input_stride = exact_div(N_FRAMES, model.dims.n_audio_ctx)
+        self.time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+
+        # waveform samples that are not covered by a complete STFT frame yet, after the
+        # zero padding that centers the first frame on the first sample
+        self.pending = torch.zeros(N_FFT // 2)
+        self.frames: List[torch.Tensor] = []  # unclamped log-Mel frames of the buffer
+        self.buffer_frame = 0  # the index of the first frame in the buffer
+        self.n_frames = 0  # the number of frames computed so far
+        self.n_samples = 0  # the number of samples inserted so far
+        self.decoded_samples = 0  # the value of n_samples at the last decoding
+
+        self.hypothesis: List[Tuple[float, float, List[int]]] = []
+        self.segments: List[dict] = []
+        self.all_tokens: List[int] = []
+
+    @property
+    def buffer_start(self) -> float:
+        return self.buffer_frame * HOP_LENGTH / SAMPLE_RATE
+
+    def insert_audio(self, audio: np.ndarray):
+        """
+        Append a block of mono 16 kHz audio, as float32 values in [-1, 1] or int16 PCM samples,
+        and decode the buffer if enough new audio has arrived
+        """
+        audio = np.asarray(audio).reshape(-1)
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) / 32768.0
+        audio = torch.from_numpy(audio.astype(np.float32, copy=False))
+
+        # insert long blocks chunk by chunk, so that the buffer never exceeds 30 seconds
+        chunk_size = round(self.min_chunk_length * SAMPLE_RATE)
+        for chunk in audio.split(chunk_size):
+            self._append(chunk)
+            self.n_samples += len(chunk)
+            if self.n_samples - self.decoded_samples >= chunk_size:
+                self.process()
+
+    def _append(self, audio: torch.Tensor):
+        self.pending = torch.cat([self.pending, audio])
+        count = (len(self.pending) - N_FFT) // HOP_LENGTH + 1
+        if count > 0:
+            end = (count - 1) * HOP_LENGTH + N_FFT
+            frames = _log_mel_frames(self.pending[:end], self.model.dims.n_mels)
+            self.frames.append(frames)
+            self.pending = self.pending[count * HOP_LENGTH :]
+            self.n_frames += count
+
+    def process(self):
+        """Decode the buffer, commit the segments that agree with the previous decoding"""
+        self.decoded_samples = self.n_samples
+        hypothesis, complete = self._decode()
+
+        if len(hypothesis) == 0:
+            # nothing is said; drop all but the last chunk, where speech may be starting
+            self.hypothesis = []
+            self._trim(
+                self.n_frames - round(self.min_chunk_length * SAMPLE_RATE / HOP_LENGTH)
+            )
+        else:
+            agreed = 0
+            while (
+                agreed < min(complete, len(self.hypothesis))
+                and hypothesis[agreed][2] == self.hypothesis[agreed][2]
+            ):
+                agreed += 1
+
+            buffer_length = (
+                (self.n_frames - self.buffer_frame) * HOP_LENGTH / SAMPLE_RATE
+            )
+            if agreed == 0 and buffer_length > self.max_buffer_length:
+                # do not wait for agreement any longer; the whole buffer is cut if needed
+                agreed = complete or len(hypothesis)
+
+            self._commit(hypothesis[:agreed])
+            self.hypothesis = hypothesis[agreed:]
+
+        if self.on_partial is not None:
+            tokens = [
+                token for *_, text_tokens in self.hypothesis for token in text_tokens
+            ]
+            self.on_partial(
+                dict(
+                    start=self.buffer_start,
+                    end=self.n_samples / SAMPLE_RATE,
+                    text=self.tokenizer.decode(tokens) if self.tokenizer else "",
+                    tokens=tokens,
+                )
+            )
+
+    def finish(self) -> dict:
+        """
+        Decode and commit the rest of the buffer, and return the whole transcription like
+        `transcribe()` does
+        """
+        try:
+            self._append(
+                torch.zeros(N_FFT // 2)
+            )  # the frames centered on the last samples
+            if self.n_samples > self.decoded_samples or self.hypothesis:
+                hypothesis, _ = self._decode()
+                self._commit(hypothesis)
+                self.hypothesis = []
+        finally:
+            self.close()
+
+        language = self.decode_options.get("language")
+        return dict(
+            text=self.tokenizer.decode(self.all_tokens) if self.tokenizer else "",
+            segments=self.segments,
+            language=language,
+        )
+
+    def close(self):
+        """Remove the decoding session's hooks from the model, e.g. when abandoning the stream"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _decode(self) -> Tuple[List[Tuple[float, float, List[int]]], int]:
+        """
+        Decode the buffer and split the text into segments of (start, end, text tokens), with
+        absolute times; also returns the number of segments that were closed by a timestamp
+        """
+        if self.n_frames == self.buffer_frame:
+            return [], 0
+
+        log_spec = torch.cat(self.frames, dim=-1)
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        mel = pad_or_trim((log_spec + 4.0) / 4.0, N_FRAMES).to(self.model.device)
+        if self.decode_options.get("fp16", True):
+            mel = mel.half()
+
+        if self.session is None:
+            if self.decode_options.get("language") is None:
+                if self.model.is_multilingual:
+                    _, probs = self.model.detect_language(mel)
+                    self.decode_options["language"] = max(probs, key=probs.get)
+                else:
+                    self.decode_options["language"] = "en"
+            self.tokenizer = get_tokenizer(
+                self.model.is_multilingual,
+                num_languages=self.model.num_languages,
+                language=self.decode_options["language"],
+                task=self.decode_options.get("task", "transcribe"),
+            )
+            options = DecodingOptions(**self.decode_options)
+            self.session = DecodingSession(self.model, options)
+
+        prompt = self.all_tokens[-(self.model.dims.n_text_ctx // 2 - 1) :]
+        try:
+            result: DecodingResult = self.session.decode(mel, prompt)
+        except BaseException:
+            self.close()  # a new session is created on the next call
+            raise
+
+        if (
+            self.no_speech_threshold is not None
+            and result.no_speech_prob > self.no_speech_threshold
+            and self.logprob_threshold is not None
+            and result.avg_logprob < self.logprob_threshold
+        ):
+            return [], 0
+
+        buffer_end = self.n_frames * HOP_LENGTH / SAMPLE_RATE
+        timestamp_begin = self.tokenizer.timestamp_begin
+        segments = []
+        start, text_tokens = None, []
+        for token in result.tokens:
+            if token >= timestamp_begin:
+                time = (token - timestamp_begin) * self.time_precision
+                time = min(self.buffer_start + time, buffer_end)
+                if start is not None and text_tokens:
+                    segments.append((start, time, text_tokens))
+                    start, text_tokens = None, []
+                else:
+                    start = time
+            elif token < self.tokenizer.eot:
+                if start is None:
+                    start = segments[-1][1] if segments else self.buffer_start
+                text_tokens.append(token)
+
+        complete = len(segments)
+        if text_tokens:
+            segments.append((start, buffer_end, text_tokens))
+        return segments, complete
+
+    def _commit(self, segments: List[Tuple[float, float, List[int]]]):
+        for start, end, text_tokens in segments:
+            segment = dict(
+                id=len(self.segments),
+                start=round(start, 2),
+                end=round(end, 2),
+                text=self.tokenizer.decode(text_tokens),
+                tokens=text_tokens,
+            )
+            self.segments.append(segment)
+            self.all_tokens.extend(text_tokens)
+            if self.on_final is not None:
+                self.on_final(segment)
+
+        if segments:
+            self._trim(round(segments[-1][1] * SAMPLE_RATE / HOP_LENGTH))
+
+    def _trim(self, frame: int):
+        """Drop the frames before the given frame index from the buffer"""
+        frame = min(max(frame, self.buffer_frame), self.n_frames)
+        if frame > self.buffer_frame:
+            log_spec = torch.cat(self.frames, dim=-1)[:, frame - self.buffer_frame :]
+            self.frames = [log_spec]
+            self.buffer_frame = frame
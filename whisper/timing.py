@@ -2,7 +2,7 @@ import itertools
 import subprocess
 import warnings
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional
 
 import numba
 import numpy as np
@@ -54,7 +54,7 @@ def median_filter(x: torch.Tensor, filter_width: int):
     return result
 
 
-@numba.jit(nopython=True)
+@numba.jit(nopython=True, cache=True)
 def backtrace(trace: np.ndarray):
     i = trace.shape[0] - 1
     j = trace.shape[1] - 1
@@ -79,8 +79,53 @@ def backtrace(trace: np.ndarray):
     return result[::-1, :].T
 
 
-@numba.jit(nopython=True, parallel=True)
-def dtw_cpu(x: np.ndarray):
+@numba.jit(nopython=True, cache=True)
+def backtrace_into(trace: np.ndarray, path: np.ndarray) -> int:
+    """Like `backtrace`, but writes the path into `path[:, :length]` and returns its length"""
+    i = trace.shape[0] - 1
+    j = trace.shape[1] - 1
+    trace[0, :] = 2
+    trace[:, 0] = 1
+
+    length = 0
+    while i > 0 or j > 0:
+        path[0, length] = i - 1
+        path[1, length] = j - 1
+        length += 1
+
+        if trace[i, j] == 0:
+            i -= 1
+            j -= 1
+        elif trace[i, j] == 1:
+            i -= 1
+        elif trace[i, j] == 2:
+            j -= 1
+        else:
+            raise ValueError("Unexpected trace[i, j]")
+
+    path[:, :length] = path[:, length - 1 :: -1].copy()
+    return length
+
+
+@numba.jit(nopython=True, cache=True)
+def dtw_step(cost: np.ndarray, trace: np.ndarray, x: np.ndarray, i: int, j: int):
+    c0 = cost[i - 1, j - 1]
+    c1 = cost[i - 1, j]
+    c2 = cost[i, j - 1]
+
+    if c0 < c1 and c0 < c2:
+        c, t = c0, 0
+    elif c1 < c0 and c1 < c2:
+        c, t = c1, 1
+    else:
+        c, t = c2, 2
+
+    cost[i, j] = x[i - 1, j - 1] + c
+    trace[i, j] = t
+
+
+@numba.jit(nopython=True, cache=True)
+def dtw_trace(x: np.ndarray) -> np.ndarray:
     N, M = x.shape
     cost = np.ones((N + 1, M + 1), dtype=np.float32) * np.inf
     trace = -np.ones((N + 1, M + 1), dtype=np.float32)
@@ -88,23 +133,52 @@ def dtw_cpu(x: np.ndarray):
     cost[0, 0] = 0
     for j in range(1, M + 1):
         for i in range(1, N + 1):
-            c0 = cost[i - 1, j - 1]
-            c1 = cost[i - 1, j]
-            c2 = cost[i, j - 1]
-
-            if c0 < c1 and c0 < c2:
-                c, t = c0, 0
-            elif c1 < c0 and c1 < c2:
-                c, t = c1, 1
-            else:
-                c, t = c2, 2
+            dtw_step(cost, trace, x, i, j)
+
+    return trace
+
+
+@numba.jit(nopython=True, cache=True)
+def dtw_cpu(x: np.ndarray):
+    return backtrace(dtw_trace(x))
+
 
-            cost[i, j] = x[i - 1, j - 1] + c
-            trace[i, j] = t
+@numba.jit(nopython=True, parallel=True, cache=True)
+def dtw_cpu_wavefront(x: np.ndarray):
+    """
+    Same as `dtw_cpu`, but fills the cost matrix one anti-diagonal at a time, computing the cells
+    of each anti-diagonal in parallel; worthwhile for a single large matrix on many cores
+    """
+    N, M = x.shape
+    cost = np.ones((N + 1, M + 1), dtype=np.float32) * np.inf
+    trace = -np.ones((N + 1, M + 1), dtype=np.float32)
+
+    cost[0, 0] = 0
+    for d in range(2, N + M + 1):
+        # the cells (i, j) with i + j == d only depend on the previous two anti-diagonals
+        i_start = max(1, d - M)
+        i_end = min(N, d - 1)
+        for k in numba.prange(i_end - i_start + 1):
+            i = i_start + k
+            dtw_step(cost, trace, x, i, d - i)
 
     return backtrace(trace)
 
 
+@numba.jit(nopython=True, parallel=True, cache=True)
+def dtw_cpu_batch(x: np.ndarray, shapes: np.ndarray, paths: np.ndarray) -> np.ndarray:
+    """
+    Solve several DTW problems in parallel, one per core; `x[b, :N, :M]` holds the b-th cost matrix,
+    where `(N, M) = shapes[b]`, and its path is written into `paths[b]`. Returns the path lengths.
+    """
+    lengths = np.zeros(x.shape[0], dtype=np.int64)
+    for b in numba.prange(x.shape[0]):
+        N, M = shapes[b, 0], shapes[b, 1]
+        trace = dtw_trace(x[b, :N, :M])
+        lengths[b] = backtrace_into(trace, paths[b])
+    return lengths
+
+
 def dtw_cuda(x, BLOCK_SIZE=1024):
     from .triton_ops import dtw_kernel
 
@@ -151,6 +225,37 @@ def dtw(x: torch.Tensor) -> np.ndarray:
     return dtw_cpu(x.double().cpu().numpy())
 
 
+def dtw_batch(xs: List[torch.Tensor]) -> List[np.ndarray]:
+    """
+    Compute the DTW paths of several cost matrices of any shapes at once, e.g. those of all the
+    windows of a batch, solving the matrices in parallel across CPU cores
+
+    Returns
+    -------
+    List[np.ndarray]
+        The (2, path length) array of (text index, time index) pairs for each matrix, as `dtw`
+    """
+    if len(xs) == 0:
+        return []
+
+    shapes = np.array([x.shape for x in xs], dtype=np.int64)
+    x = np.full((len(xs), *shapes.max(axis=0)), np.inf)
+    for b, (matrix, (N, M)) in enumerate(zip(xs, shapes)):
+        x[b, :N, :M] = matrix.double().cpu().numpy()
+
+    paths = np.zeros((len(xs), 2, shapes.sum(axis=1).max()), dtype=np.int64)
+    lengths = dtw_cpu_batch(x, shapes, paths)
+    return [path[:, :length] for path, length in zip(paths, lengths)]
+
+
+def warm_up():
+    """
+    Compile the CPU kernels used for word timestamps, or load them from numba's on-disk cache, so
+    that the first call to `dtw()` does not stall; see the `warm_up` option of `load_model()`
+    """
+    dtw_cpu(np.zeros((2, 2)))
+
+
 @dataclass
 class WordTiming:
     word: str
@@ -169,7 +274,13 @@ def find_alignment(
     *,
     medfilt_width: int = 7,
     qk_scale: float = 1.0,
+    audio_features: Optional[torch.Tensor] = None,
 ) -> List[WordTiming]:
+    """
+    Align the text tokens to the audio frames using the cross-attention weights of the alignment
+    heads. If `audio_features`, the encoder output for `mel`, is given, e.g. from the
+    `DecodingResult`, only the decoder is run again.
+    """
     if len(text_tokens) == 0:
         return []
 
@@ -182,29 +293,26 @@ def find_alignment(
         ]
     ).to(model.device)
 
-    # install hooks on the cross attention layers to retrieve the attention weights
-    QKs = [None] * model.dims.n_text_layer
-    hooks = [
-        block.cross_attn.register_forward_hook(
-            lambda _, ins, outs, index=i: QKs.__setitem__(index, outs[-1][0])
-        )
-        for i, block in enumerate(model.decoder.blocks)
-    ]
+    # retrieve the weights of the alignment heads only, from the cross attention layers
+    layers, heads = model.alignment_heads.indices()
+    alignment_heads = {
+        model.decoder.blocks[layer].cross_attn: heads[layers == layer]
+        for layer in layers.unique().tolist()
+    }
 
-    from .model import disable_sdpa
+    from .model import capture_attention
 
-    with torch.no_grad(), disable_sdpa():
-        logits = model(mel.unsqueeze(0), tokens.unsqueeze(0))[0]
+    with torch.no_grad(), capture_attention(alignment_heads) as QKs:
+        if audio_features is None:
+            audio_features = model.embed_audio(mel.unsqueeze(0))[0]
+        logits = model.logits(tokens.unsqueeze(0), audio_features.unsqueeze(0))[0]
         sampled_logits = logits[len(tokenizer.sot_sequence) :, : tokenizer.eot]
         token_probs = sampled_logits.softmax(dim=-1)
         text_token_probs = token_probs[np.arange(len(text_tokens)), text_tokens]
         text_token_probs = text_token_probs.tolist()
 
-    for hook in hooks:
-        hook.remove()
-
     # heads * tokens * frames
-    weights = torch.stack([QKs[_l][_h] for _l, _h in model.alignment_heads.indices().T])
+    weights = torch.cat([QKs[module][0] for module in alignment_heads])
     weights = weights[:, :, : num_frames // 2]
     weights = (weights * qk_scale).softmax(dim=-1)
     std, mean = torch.std_mean(weights, dim=-2, keepdim=True, unbiased=False)
@@ -284,17 +284,22 @@ class Tokenizer:
         return self.split_tokens_on_spaces(tokens)
 
     def split_tokens_on_unicode(self, tokens: List[int]):
-        decoded_full = self.decode_with_timestamps(tokens)
+        # work on the raw bytes of each token, so that only the current word is decoded again as
+        # tokens are appended, instead of calling tiktoken on a growing list of tokens
+        token_bytes = [self.encoding.decode_single_token_bytes(t) for t in tokens]
+        decoded_full = b"".join(token_bytes).decode("utf-8", errors="replace")
         replacement_char = "\ufffd"
 
         words = []
         word_tokens = []
         current_tokens = []
+        current_bytes = bytearray()
         unicode_offset = 0
 
-        for token in tokens:
+        for token, data in zip(tokens, token_bytes):
             current_tokens.append(token)
-            decoded = self.decode_with_timestamps(current_tokens)
+            current_bytes += data
+            decoded = current_bytes.decode("utf-8", errors="replace")
 
             if (
                 replacement_char not in decoded
@@ -304,6 +309,7 @@ class Tokenizer:
                 words.append(decoded)
                 word_tokens.append(current_tokens)
                 current_tokens = []
+                current_bytes = bytearray()
                 unicode_offset += len(decoded)
 
         return words, word_tokens
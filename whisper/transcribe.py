@@ -2,7 +2,19 @@ import argparse
 import os
 import traceback
 import warnings
-from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 import torch
@@ -14,10 +26,16 @@ from .audio import (
     N_FRAMES,
     N_SAMPLES,
     SAMPLE_RATE,
+    load_audio,
     log_mel_spectrogram,
     pad_or_trim,
 )
-from .decoding import DecodingOptions, DecodingResult
+from .decoding import (
+    DecodingOptions,
+    DecodingResult,
+    DecodingSession,
+    decode_temperatures,
+)
 from .timing import add_word_timestamps
 from .tokenizer import LANGUAGES, TO_LANGUAGE_CODE, get_tokenizer
 from .utils import (
@@ -30,6 +48,7 @@ from .utils import (
     optional_int,
     str2bool,
 )
+from .vad import speech_regions
 
 if TYPE_CHECKING:
     from .model import Whisper
@@ -51,7 +70,11 @@ def transcribe(
     prepend_punctuations: str = "\"'“¿([{-",
     append_punctuations: str = "\"'.。,，!！?？:：”)]}、",
     clip_timestamps: Union[str, List[float]] = "0",
+    vad: bool = False,
     hallucination_silence_threshold: Optional[float] = None,
+    batch_size: Optional[int] = None,
+    speculative_fallback: int = 0,
+    segment_callback: Optional[Callable[[List[dict]], None]] = None,
     **decode_options,
 ):
     """
@@ -115,10 +138,29 @@ def transcribe(
         Comma-separated list start,end,start,end,... timestamps (in seconds) of clips to process.
         The last end timestamp defaults to the end of the file.
 
+    vad: bool
+        Detect the speech regions with a lightweight energy-based voice activity detector first,
+        and transcribe only those as clips, so that long silences are never encoded; replaces
+        `clip_timestamps`
+
     hallucination_silence_threshold: Optional[float]
         When word_timestamps is True, skip silent periods longer than this threshold (in seconds)
         when a possible hallucination is detected
 
+    batch_size: Optional[int]
+        If greater than 1, split the audio into consecutive 30-second windows up front and decode
+        up to this many windows at once. Windows are not conditioned on each other's text, so this
+        implies `condition_on_previous_text=False`; `hallucination_silence_threshold` is ignored.
+
+    speculative_fallback: int
+        The number of subsequent fallback temperatures to decode together with each attempt, as
+        one batched pass, so that a window failing the thresholds does not have to be decoded again
+        at the next temperature. Costs extra compute on windows that would not have fallen back.
+
+    segment_callback: Optional[Callable[[List[dict]], None]]
+        If given, called with the new segments of each decoded window as soon as they are final,
+        e.g. to stream the results of a long transcription
+
     Returns
     -------
     A dictionary containing the resulting text ("text") and segment-level details ("segments"), and
@@ -135,6 +177,16 @@ def transcribe(
     if dtype == torch.float32:
         decode_options["fp16"] = False
 
+    if vad:
+        if clip_timestamps != "0":
+            warnings.warn("clip_timestamps is ignored when vad is True")
+        if isinstance(audio, str):
+            audio = load_audio(audio)
+        waveform = audio.cpu().numpy() if isinstance(audio, torch.Tensor) else audio
+        clip_timestamps = [ts for region in speech_regions(waveform) for ts in region]
+        if not clip_timestamps:
+            return dict(text="", segments=[], language=decode_options.get("language"))
+
     # Pad 30-seconds of silence to the input audio, for slicing
     mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
     content_frames = mel.shape[-1] - N_FRAMES
@@ -148,7 +200,10 @@ def transcribe(
                 print(
                     "Detecting language using up to the first 30 seconds. Use `--language` to specify the language"
                 )
-            mel_segment = pad_or_trim(mel, N_FRAMES).to(model.device).to(dtype)
+            # with vad, the language is detected from the first speech instead
+            start = round(clip_timestamps[0] * FRAMES_PER_SECOND) if vad else 0
+            mel_segment = mel[:, start : start + N_FRAMES]
+            mel_segment = pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
             _, probs = model.detect_language(mel_segment)
             decode_options["language"] = max(probs, key=probs.get)
             if verbose is not None:
@@ -181,15 +236,58 @@ def transcribe(
     if word_timestamps and task == "translate":
         warnings.warn("Word-level timestamps on translations may not be reliable.")
 
-    def decode_with_fallback(segment: torch.Tensor) -> DecodingResult:
+    def needs_fallback(decode_result: DecodingResult) -> bool:
+        needs_fallback = False
+        if (
+            compression_ratio_threshold is not None
+            and decode_result.compression_ratio > compression_ratio_threshold
+        ):
+            needs_fallback = True  # too repetitive
+        if (
+            logprob_threshold is not None
+            and decode_result.avg_logprob < logprob_threshold
+        ):
+            needs_fallback = True  # average log probability is too low
+        if (
+            no_speech_threshold is not None
+            and decode_result.no_speech_prob > no_speech_threshold
+            and logprob_threshold is not None
+            and decode_result.avg_logprob < logprob_threshold
+        ):
+            needs_fallback = False  # silence
+        return needs_fallback
+
+    # one decoding session per temperature, reused across windows with each window's prompt
+    sessions: Dict[float, DecodingSession] = {}
+
+    def decode_with_fallback(
+        segment: torch.Tensor,
+    ) -> Union[DecodingResult, List[DecodingResult]]:
         temperatures = (
             [temperature] if isinstance(temperature, (int, float)) else temperature
         )
-        decode_result = None
+        if single := segment.ndim == 2:
+            segment = segment.unsqueeze(0)
+
+        # encode the audio once; every temperature reuses the same audio features
+        with torch.no_grad():
+            audio_features = model.embed_audio(segment)
+
+        # only the windows that failed at the previous temperatures are decoded again
+        decode_results: List[Optional[DecodingResult]] = [None] * segment.shape[0]
+        pending = list(range(segment.shape[0]))
+
+        index = 0
+        while index < len(temperatures) and pending:
+            # decode the next temperature, plus up to `speculative_fallback` later ones in the
+            # same batch; beam search at t == 0 cannot be batched together with sampling
+            group = temperatures[index : index + 1 + speculative_fallback]
+            if group[0] == 0 and decode_options.get("beam_size") is not None:
+                group = group[:1]
+            index += len(group)
 
-        for t in temperatures:
             kwargs = {**decode_options}
-            if t > 0:
+            if max(group) > 0:
                 # disable beam_size and patience when t > 0
                 kwargs.pop("beam_size", None)
                 kwargs.pop("patience", None)
@@ -197,31 +295,28 @@ def transcribe(
                 # disable best_of when t == 0
                 kwargs.pop("best_of", None)
 
-            options = DecodingOptions(**kwargs, temperature=t)
-            decode_result = model.decode(segment, options)
+            if len(group) == 1:
+                prompt = kwargs.pop("prompt", None)
+                if group[0] not in sessions:
+                    options = DecodingOptions(**kwargs, temperature=group[0])
+                    sessions[group[0]] = DecodingSession(model, options)
+                session = sessions[group[0]]
+                results = [[r] for r in session.decode(audio_features[pending], prompt)]
+            else:
+                options = DecodingOptions(**kwargs)
+                results = decode_temperatures(
+                    model, audio_features[pending], group, options
+                )
 
-            needs_fallback = False
-            if (
-                compression_ratio_threshold is not None
-                and decode_result.compression_ratio > compression_ratio_threshold
-            ):
-                needs_fallback = True  # too repetitive
-            if (
-                logprob_threshold is not None
-                and decode_result.avg_logprob < logprob_threshold
-            ):
-                needs_fallback = True  # average log probability is too low
-            if (
-                no_speech_threshold is not None
-                and decode_result.no_speech_prob > no_speech_threshold
-                and logprob_threshold is not None
-                and decode_result.avg_logprob < logprob_threshold
-            ):
-                needs_fallback = False  # silence
-            if not needs_fallback:
-                break
+            # keep the first result that passes the thresholds, or the last one tried
+            for i, candidates in zip(pending, results):
+                decode_results[i] = next(
+                    (r for r in candidates if not needs_fallback(r)), candidates[-1]
+                )
 
-        return decode_result
+            pending = [i for i in pending if needs_fallback(decode_results[i])]
+
+        return decode_results[0] if single else decode_results
 
     clip_idx = 0
     seek = seek_clips[clip_idx][0]
@@ -244,7 +339,12 @@ def transcribe(
         initial_prompt_tokens = []
 
     def new_segment(
-        *, start: float, end: float, tokens: torch.Tensor, result: DecodingResult
+        *,
+        seek: int,
+        start: float,
+        end: float,
+        tokens: torch.Tensor,
+        result: DecodingResult,
     ):
         tokens = tokens.tolist()
         text_tokens = [token for token in tokens if token < tokenizer.eot]
@@ -260,258 +360,506 @@ def transcribe(
             "no_speech_prob": result.no_speech_prob,
         }
 
-    # show the progress bar when verbose is False (if True, transcribed text will be printed)
-    with tqdm.tqdm(
-        total=content_frames, unit="frames", disable=verbose is not False
-    ) as pbar:
-        last_speech_timestamp = 0.0
-        # NOTE: This loop is obscurely flattened to make the diff readable.
-        # A later commit should turn this into a simpler nested loop.
-        # for seek_clip_start, seek_clip_end in seek_clips:
-        #     while seek < seek_clip_end
-        while clip_idx < len(seek_clips):
-            seek_clip_start, seek_clip_end = seek_clips[clip_idx]
-            if seek < seek_clip_start:
-                seek = seek_clip_start
-            if seek >= seek_clip_end:
-                clip_idx += 1
-                if clip_idx < len(seek_clips):
-                    seek = seek_clips[clip_idx][0]
-                continue
-            time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
-            window_end_time = float((seek + N_FRAMES) * HOP_LENGTH / SAMPLE_RATE)
-            segment_size = min(N_FRAMES, content_frames - seek, seek_clip_end - seek)
-            mel_segment = mel[:, seek : seek + segment_size]
-            segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
-            mel_segment = pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
+    def split_segments(
+        tokens: torch.Tensor,
+        result: DecodingResult,
+        *,
+        seek: int,
+        segment_size: int,
+        keep_unfinished: bool = False,
+    ) -> Tuple[List[dict], int, bool]:
+        """
+        Split the tokens decoded for the window at `seek` into timestamped segments. Returns the
+        segments, the number of mel frames they consume, and whether the output ended with a single
+        timestamp. An unfinished trailing segment is dropped unless `keep_unfinished` is True, in
+        which case it is kept as ending at the end of the window.
+        """
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+        segments = []
+
+        timestamp_tokens: torch.Tensor = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
+        consecutive.add_(1)
+        if len(consecutive) > 0:
+            # if the output contains two consecutive timestamp tokens
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+
+            last_slice = 0
+            for current_slice in slices:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start_timestamp_pos = (
+                    sliced_tokens[0].item() - tokenizer.timestamp_begin
+                )
+                end_timestamp_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                segments.append(
+                    new_segment(
+                        seek=seek,
+                        start=time_offset + start_timestamp_pos * time_precision,
+                        end=time_offset + end_timestamp_pos * time_precision,
+                        tokens=sliced_tokens,
+                        result=result,
+                    )
+                )
+                last_slice = current_slice
 
-            if carry_initial_prompt:
-                nignored = max(len(initial_prompt_tokens), prompt_reset_since)
-                remaining_prompt = all_tokens[nignored:][-remaining_prompt_length:]
-                decode_options["prompt"] = initial_prompt_tokens + remaining_prompt
+            if single_timestamp_ending:
+                # single timestamp at the end means no speech after the last timestamp.
+                consumed_frames = segment_size
             else:
-                decode_options["prompt"] = all_tokens[prompt_reset_since:]
-
-            result: DecodingResult = decode_with_fallback(mel_segment)
-            tokens = torch.tensor(result.tokens)
-
-            if no_speech_threshold is not None:
-                # no voice activity check
-                should_skip = result.no_speech_prob > no_speech_threshold
-                if (
-                    logprob_threshold is not None
-                    and result.avg_logprob > logprob_threshold
-                ):
-                    # don't skip if the logprob is high enough, despite the no_speech_prob
-                    should_skip = False
-
-                if should_skip:
-                    seek += segment_size  # fast-forward to the next segment boundary
-                    continue
+                # otherwise, ignore the unfinished segment and seek to the last timestamp
+                last_timestamp_pos = (
+                    tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                )
+                consumed_frames = last_timestamp_pos * input_stride
 
-            previous_seek = seek
-            current_segments = []
-
-            # anomalous words are very long/short/improbable
-            def word_anomaly_score(word: dict) -> float:
-                probability = word.get("probability", 0.0)
-                duration = word["end"] - word["start"]
-                score = 0.0
-                if probability < 0.15:
-                    score += 1.0
-                if duration < 0.133:
-                    score += (0.133 - duration) * 15
-                if duration > 2.0:
-                    score += duration - 2.0
-                return score
-
-            def is_segment_anomaly(segment: Optional[dict]) -> bool:
-                if segment is None or not segment["words"]:
-                    return False
-                words = [w for w in segment["words"] if w["word"] not in punctuation]
-                words = words[:8]
-                score = sum(word_anomaly_score(w) for w in words)
-                return score >= 3 or score + 0.01 >= len(words)
-
-            def next_words_segment(segments: List[dict]) -> Optional[dict]:
-                return next((s for s in segments if s["words"]), None)
-
-            timestamp_tokens: torch.Tensor = tokens.ge(tokenizer.timestamp_begin)
-            single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
-
-            consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0]
-            consecutive.add_(1)
-            if len(consecutive) > 0:
-                # if the output contains two consecutive timestamp tokens
-                slices = consecutive.tolist()
-                if single_timestamp_ending:
-                    slices.append(len(tokens))
-
-                last_slice = 0
-                for current_slice in slices:
-                    sliced_tokens = tokens[last_slice:current_slice]
+                unfinished_tokens = tokens[last_slice:]
+                if keep_unfinished and unfinished_tokens.lt(tokenizer.eot).any():
                     start_timestamp_pos = (
-                        sliced_tokens[0].item() - tokenizer.timestamp_begin
-                    )
-                    end_timestamp_pos = (
-                        sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                        unfinished_tokens[0].item() - tokenizer.timestamp_begin
                     )
-                    current_segments.append(
+                    segments.append(
                         new_segment(
+                            seek=seek,
                             start=time_offset + start_timestamp_pos * time_precision,
-                            end=time_offset + end_timestamp_pos * time_precision,
-                            tokens=sliced_tokens,
+                            end=time_offset + segment_duration,
+                            tokens=unfinished_tokens,
                             result=result,
                         )
                     )
-                    last_slice = current_slice
+                    consumed_frames = segment_size
+        else:
+            duration = segment_duration
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if (
+                len(timestamps) > 0
+                and timestamps[-1].item() != tokenizer.timestamp_begin
+            ):
+                # no consecutive timestamps but it has a timestamp; use the last one.
+                last_timestamp_pos = timestamps[-1].item() - tokenizer.timestamp_begin
+                duration = last_timestamp_pos * time_precision
+
+            segments.append(
+                new_segment(
+                    seek=seek,
+                    start=time_offset,
+                    end=time_offset + duration,
+                    tokens=tokens,
+                    result=result,
+                )
+            )
+            consumed_frames = segment_size
 
-                if single_timestamp_ending:
-                    # single timestamp at the end means no speech after the last timestamp.
-                    seek += segment_size
-                else:
-                    # otherwise, ignore the unfinished segment and seek to the last timestamp
-                    last_timestamp_pos = (
-                        tokens[last_slice - 1].item() - tokenizer.timestamp_begin
-                    )
-                    seek += last_timestamp_pos * input_stride
-            else:
-                duration = segment_duration
-                timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+        return segments, consumed_frames, single_timestamp_ending
+
+    try:
+        if batch_size is not None and batch_size > 1:
+            if hallucination_silence_threshold is not None:
+                warnings.warn(
+                    "hallucination_silence_threshold is ignored when batching"
+                )
+
+            # fixed-stride windows within each clip; they do not depend on each other's output
+            windows: List[Tuple[int, int]] = [
+                (seek, min(N_FRAMES, content_frames - seek, seek_clip_end - seek))
+                for seek_clip_start, seek_clip_end in seek_clips
+                for seek in range(
+                    seek_clip_start, min(seek_clip_end, content_frames), N_FRAMES
+                )
+            ]
+
+            # windows sharing a batch must share the prompt, which differs only for the first
+            # window when the initial prompt is not carried over
+            batches: List[Tuple[List[int], List[Tuple[int, int]]]] = []
+            for index, window in enumerate(windows):
+                prompt = (
+                    initial_prompt_tokens if carry_initial_prompt or index == 0 else []
+                )
                 if (
-                    len(timestamps) > 0
-                    and timestamps[-1].item() != tokenizer.timestamp_begin
+                    batches
+                    and batches[-1][0] == prompt
+                    and len(batches[-1][1]) < batch_size
                 ):
-                    # no consecutive timestamps but it has a timestamp; use the last one.
-                    last_timestamp_pos = (
-                        timestamps[-1].item() - tokenizer.timestamp_begin
+                    batches[-1][1].append(window)
+                else:
+                    batches.append((prompt, [window]))
+
+            with tqdm.tqdm(
+                total=content_frames, unit="frames", disable=verbose is not False
+            ) as pbar:
+                last_speech_timestamp = 0.0
+                for prompt, batch in batches:
+                    mel_segments = (
+                        torch.stack(
+                            [
+                                pad_or_trim(
+                                    mel[:, seek : seek + segment_size], N_FRAMES
+                                )
+                                for seek, segment_size in batch
+                            ]
+                        )
+                        .to(model.device)
+                        .to(dtype)
                     )
-                    duration = last_timestamp_pos * time_precision
 
-                current_segments.append(
-                    new_segment(
-                        start=time_offset,
-                        end=time_offset + duration,
-                        tokens=tokens,
-                        result=result,
-                    )
+                    decode_options["prompt"] = prompt
+                    results: List[DecodingResult] = decode_with_fallback(mel_segments)
+
+                    for (seek, segment_size), mel_segment, result in zip(
+                        batch, mel_segments, results
+                    ):
+                        pbar.update(segment_size)
+
+                        if no_speech_threshold is not None:
+                            # no voice activity check
+                            should_skip = result.no_speech_prob > no_speech_threshold
+                            if (
+                                logprob_threshold is not None
+                                and result.avg_logprob > logprob_threshold
+                            ):
+                                # don't skip if the logprob is high enough, despite the no_speech_prob
+                                should_skip = False
+
+                            if should_skip:
+                                continue
+
+                        current_segments, _, _ = split_segments(
+                            torch.tensor(result.tokens),
+                            result,
+                            seek=seek,
+                            segment_size=segment_size,
+                            keep_unfinished=True,
+                        )
+
+                        if word_timestamps:
+                            add_word_timestamps(
+                                segments=current_segments,
+                                model=model,
+                                tokenizer=tokenizer,
+                                mel=mel_segment,
+                                num_frames=segment_size,
+                                audio_features=result.audio_features,
+                                prepend_punctuations=prepend_punctuations,
+                                append_punctuations=append_punctuations,
+                                last_speech_timestamp=last_speech_timestamp,
+                            )
+                            last_word_end = get_end(current_segments)
+                            if last_word_end is not None:
+                                last_speech_timestamp = last_word_end
+
+                        if verbose:
+                            for segment in current_segments:
+                                start, end = segment["start"], segment["end"]
+                                line = f"[{format_timestamp(start)} --> {format_timestamp(end)}] {segment['text']}"
+                                print(make_safe(line))
+
+                        # if a segment is instantaneous or does not contain text, clear it
+                        for segment in current_segments:
+                            if (
+                                segment["start"] == segment["end"]
+                                or segment["text"].strip() == ""
+                            ):
+                                segment["text"] = ""
+                                segment["tokens"] = []
+                                segment["words"] = []
+
+                        new_segments = [
+                            {"id": i, **segment}
+                            for i, segment in enumerate(
+                                current_segments, start=len(all_segments)
+                            )
+                        ]
+                        all_segments.extend(new_segments)
+                        if segment_callback is not None and new_segments:
+                            segment_callback(new_segments)
+                        all_tokens.extend(
+                            [
+                                token
+                                for segment in current_segments
+                                for token in segment["tokens"]
+                            ]
+                        )
+
+            return dict(
+                text=tokenizer.decode(all_tokens[len(initial_prompt_tokens) :]),
+                segments=all_segments,
+                language=language,
+            )
+
+        # show the progress bar when verbose is False (if True, transcribed text will be printed)
+        with tqdm.tqdm(
+            total=content_frames, unit="frames", disable=verbose is not False
+        ) as pbar:
+            last_speech_timestamp = 0.0
+            # NOTE: This loop is obscurely flattened to make the diff readable.
+            # A later commit should turn this into a simpler nested loop.
+            # for seek_clip_start, seek_clip_end in seek_clips:
+            #     while seek < seek_clip_end
+            while clip_idx < len(seek_clips):
+                seek_clip_start, seek_clip_end = seek_clips[clip_idx]
+                if seek < seek_clip_start:
+                    seek = seek_clip_start
+                if seek >= seek_clip_end:
+                    clip_idx += 1
+                    if clip_idx < len(seek_clips):
+                        seek = seek_clips[clip_idx][0]
+                    continue
+                time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+                window_end_time = float((seek + N_FRAMES) * HOP_LENGTH / SAMPLE_RATE)
+                segment_size = min(
+                    N_FRAMES, content_frames - seek, seek_clip_end - seek
                 )
-                seek += segment_size
-
-            if word_timestamps:
-                add_word_timestamps(
-                    segments=current_segments,
-                    model=model,
-                    tokenizer=tokenizer,
-                    mel=mel_segment,
-                    num_frames=segment_size,
-                    prepend_punctuations=prepend_punctuations,
-                    append_punctuations=append_punctuations,
-                    last_speech_timestamp=last_speech_timestamp,
+                mel_segment = mel[:, seek : seek + segment_size]
+                segment_duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+                mel_segment = (
+                    pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
                 )
 
-                if not single_timestamp_ending:
-                    last_word_end = get_end(current_segments)
-                    if last_word_end is not None and last_word_end > time_offset:
-                        seek = round(last_word_end * FRAMES_PER_SECOND)
+                if carry_initial_prompt:
+                    nignored = max(len(initial_prompt_tokens), prompt_reset_since)
+                    remaining_prompt = all_tokens[nignored:][-remaining_prompt_length:]
+                    decode_options["prompt"] = initial_prompt_tokens + remaining_prompt
+                else:
+                    decode_options["prompt"] = all_tokens[prompt_reset_since:]
+
+                result: DecodingResult = decode_with_fallback(mel_segment)
+                tokens = torch.tensor(result.tokens)
+
+                if no_speech_threshold is not None:
+                    # no voice activity check
+                    should_skip = result.no_speech_prob > no_speech_threshold
+                    if (
+                        logprob_threshold is not None
+                        and result.avg_logprob > logprob_threshold
+                    ):
+                        # don't skip if the logprob is high enough, despite the no_speech_prob
+                        should_skip = False
+
+                    if should_skip:
+                        seek += (
+                            segment_size  # fast-forward to the next segment boundary
+                        )
+                        continue
+
+                previous_seek = seek
+
+                # anomalous words are very long/short/improbable
+                def word_anomaly_score(word: dict) -> float:
+                    probability = word.get("probability", 0.0)
+                    duration = word["end"] - word["start"]
+                    score = 0.0
+                    if probability < 0.15:
+                        score += 1.0
+                    if duration < 0.133:
+                        score += (0.133 - duration) * 15
+                    if duration > 2.0:
+                        score += duration - 2.0
+                    return score
+
+                def is_segment_anomaly(segment: Optional[dict]) -> bool:
+                    if segment is None or not segment["words"]:
+                        return False
+                    words = [
+                        w for w in segment["words"] if w["word"] not in punctuation
+                    ]
+                    words = words[:8]
+                    score = sum(word_anomaly_score(w) for w in words)
+                    return score >= 3 or score + 0.01 >= len(words)
+
+                def next_words_segment(segments: List[dict]) -> Optional[dict]:
+                    return next((s for s in segments if s["words"]), None)
+
+                current_segments, consumed_frames, single_timestamp_ending = (
+                    split_segments(tokens, result, seek=seek, segment_size=segment_size)
+                )
+                seek += consumed_frames
+
+                if word_timestamps:
+                    add_word_timestamps(
+                        segments=current_segments,
+                        model=model,
+                        tokenizer=tokenizer,
+                        mel=mel_segment,
+                        num_frames=segment_size,
+                        audio_features=result.audio_features,
+                        prepend_punctuations=prepend_punctuations,
+                        append_punctuations=append_punctuations,
+                        last_speech_timestamp=last_speech_timestamp,
+                    )
 
-                # skip silence before possible hallucinations
-                if hallucination_silence_threshold is not None:
-                    threshold = hallucination_silence_threshold
                     if not single_timestamp_ending:
                         last_word_end = get_end(current_segments)
                         if last_word_end is not None and last_word_end > time_offset:
-                            remaining_duration = window_end_time - last_word_end
-                            if remaining_duration > threshold:
-                                seek = round(last_word_end * FRAMES_PER_SECOND)
-                            else:
-                                seek = previous_seek + segment_size
-
-                    # if first segment might be a hallucination, skip leading silence
-                    first_segment = next_words_segment(current_segments)
-                    if first_segment is not None and is_segment_anomaly(first_segment):
-                        gap = first_segment["start"] - time_offset
-                        if gap > threshold:
-                            seek = previous_seek + round(gap * FRAMES_PER_SECOND)
-                            continue
-
-                    # skip silence before any possible hallucination that is surrounded
-                    # by silence or more hallucinations
-                    hal_last_end = last_speech_timestamp
-                    for si in range(len(current_segments)):
-                        segment = current_segments[si]
-                        if not segment["words"]:
-                            continue
-                        if is_segment_anomaly(segment):
-                            next_segment = next_words_segment(
-                                current_segments[si + 1 :]
-                            )
-                            if next_segment is not None:
-                                hal_next_start = next_segment["words"][0]["start"]
-                            else:
-                                hal_next_start = time_offset + segment_duration
-                            silence_before = (
-                                segment["start"] - hal_last_end > threshold
-                                or segment["start"] < threshold
-                                or segment["start"] - time_offset < 2.0
-                            )
-                            silence_after = (
-                                hal_next_start - segment["end"] > threshold
-                                or is_segment_anomaly(next_segment)
-                                or window_end_time - segment["end"] < 2.0
-                            )
-                            if silence_before and silence_after:
-                                seek = round(
-                                    max(time_offset + 1, segment["start"])
-                                    * FRAMES_PER_SECOND
+                            seek = round(last_word_end * FRAMES_PER_SECOND)
+
+                    # skip silence before possible hallucinations
+                    if hallucination_silence_threshold is not None:
+                        threshold = hallucination_silence_threshold
+                        if not single_timestamp_ending:
+                            last_word_end = get_end(current_segments)
+                            if (
+                                last_word_end is not None
+                                and last_word_end > time_offset
+                            ):
+                                remaining_duration = window_end_time - last_word_end
+                                if remaining_duration > threshold:
+                                    seek = round(last_word_end * FRAMES_PER_SECOND)
+                                else:
+                                    seek = previous_seek + segment_size
+
+                        # if first segment might be a hallucination, skip leading silence
+                        first_segment = next_words_segment(current_segments)
+                        if first_segment is not None and is_segment_anomaly(
+                            first_segment
+                        ):
+                            gap = first_segment["start"] - time_offset
+                            if gap > threshold:
+                                seek = previous_seek + round(gap * FRAMES_PER_SECOND)
+                                continue
+
+                        # skip silence before any possible hallucination that is surrounded
+                        # by silence or more hallucinations
+                        hal_last_end = last_speech_timestamp
+                        for si in range(len(current_segments)):
+                            segment = current_segments[si]
+                            if not segment["words"]:
+                                continue
+                            if is_segment_anomaly(segment):
+                                next_segment = next_words_segment(
+                                    current_segments[si + 1 :]
                                 )
-                                if content_duration - segment["end"] < threshold:
-                                    seek = content_frames
-                                current_segments[si:] = []
-                                break
-                        hal_last_end = segment["end"]
-
-                last_word_end = get_end(current_segments)
-                if last_word_end is not None:
-                    last_speech_timestamp = last_word_end
+                                if next_segment is not None:
+                                    hal_next_start = next_segment["words"][0]["start"]
+                                else:
+                                    hal_next_start = time_offset + segment_duration
+                                silence_before = (
+                                    segment["start"] - hal_last_end > threshold
+                                    or segment["start"] < threshold
+                                    or segment["start"] - time_offset < 2.0
+                                )
+                                silence_after = (
+                                    hal_next_start - segment["end"] > threshold
+                                    or is_segment_anomaly(next_segment)
+                                    or window_end_time - segment["end"] < 2.0
+                                )
+                                if silence_before and silence_after:
+                                    seek = round(
+                                        max(time_offset + 1, segment["start"])
+                                        * FRAMES_PER_SECOND
+                                    )
+                                    if content_duration - segment["end"] < threshold:
+                                        seek = content_frames
+                                    current_segments[si:] = []
+                                    break
+                            hal_last_end = segment["end"]
 
-            if verbose:
-                for segment in current_segments:
-                    start, end, text = segment["start"], segment["end"], segment["text"]
-                    line = f"[{format_timestamp(start)} --> {format_timestamp(end)}] {text}"
-                    print(make_safe(line))
-
-            # if a segment is instantaneous or does not contain text, clear it
-            for i, segment in enumerate(current_segments):
-                if segment["start"] == segment["end"] or segment["text"].strip() == "":
-                    segment["text"] = ""
-                    segment["tokens"] = []
-                    segment["words"] = []
-
-            all_segments.extend(
-                [
+                    last_word_end = get_end(current_segments)
+                    if last_word_end is not None:
+                        last_speech_timestamp = last_word_end
+
+                if verbose:
+                    for segment in current_segments:
+                        start, end, text = (
+                            segment["start"],
+                            segment["end"],
+                            segment["text"],
+                        )
+                        line = f"[{format_timestamp(start)} --> {format_timestamp(end)}] {text}"
+                        print(make_safe(line))
+
+                # if a segment is instantaneous or does not contain text, clear it
+                for i, segment in enumerate(current_segments):
+                    if (
+                        segment["start"] == segment["end"]
+                        or segment["text"].strip() == ""
+                    ):
+                        segment["text"] = ""
+                        segment["tokens"] = []
+                        segment["words"] = []
+
+                new_segments = [
                     {"id": i, **segment}
                     for i, segment in enumerate(
                         current_segments, start=len(all_segments)
                     )
                 ]
-            )
-            all_tokens.extend(
-                [token for segment in current_segments for token in segment["tokens"]]
-            )
+                all_segments.extend(new_segments)
+                if segment_callback is not None and new_segments:
+                    segment_callback(new_segments)
+                all_tokens.extend(
+                    [
+                        token
+                        for segment in current_segments
+                        for token in segment["tokens"]
+                    ]
+                )
 
-            if not condition_on_previous_text or result.temperature > 0.5:
-                # do not feed the prompt tokens if a high temperature was used
-                prompt_reset_since = len(all_tokens)
+                if not condition_on_previous_text or result.temperature > 0.5:
+                    # do not feed the prompt tokens if a high temperature was used
+                    prompt_reset_since = len(all_tokens)
 
-            # update progress bar
-            pbar.update(min(content_frames, seek) - previous_seek)
+                # update progress bar
+                pbar.update(min(content_frames, seek) - previous_seek)
 
-    return dict(
-        text=tokenizer.decode(all_tokens[len(initial_prompt_tokens) :]),
-        segments=all_segments,
-        language=language,
-    )
+        return dict(
+            text=tokenizer.decode(all_tokens[len(initial_prompt_tokens) :]),
+            segments=all_segments,
+            language=language,
+        )
+    finally:
+        # the sessions' hooks would otherwise stay on the model if transcription fails
+        for session in sessions.values():
+            session.close()
+
+
+def encode_first_windows(
+    model: "Whisper",
+    audios: List[np.ndarray],
+    dtype: torch.dtype = torch.float32,
+    detect_language: bool = False,
+):
+    """
+    Encode the first 30-second window of each audio in a single batch and store the results in
+    `model.audio_features_cache`, so that transcribing these audios one by one afterwards skips the
+    encoder for their first window. This is most effective for many short files, e.g. voicemails.
+
+    Parameters
+    ----------
+    model: Whisper
+        The Whisper model instance, with `audio_features_cache` enabled
+
+    audios: List[np.ndarray]
+        The audio waveforms, as returned by `load_audio()`
+
+    dtype: torch.dtype
+        The dtype `transcribe()` will run the model in
+
+    detect_language: bool
+        Whether to also encode the window that `transcribe()` uses for language detection
+    """
+    if model.audio_features_cache is None:
+        raise ValueError("model.audio_features_cache is not enabled")
+
+    # the same mel segments that transcribe() passes to the model, so that the cache keys match
+    mel_segments = []
+    for audio in audios:
+        mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+        content_frames = mel.shape[-1] - N_FRAMES
+        if content_frames > 0:
+            mel_segments.append(
+                pad_or_trim(mel[:, : min(N_FRAMES, content_frames)], N_FRAMES)
+            )
+        if detect_language and content_frames < N_FRAMES:
+            mel_segments.append(pad_or_trim(mel, N_FRAMES))
+
+    if mel_segments:
+        mel_segments = torch.stack(mel_segments).to(model.device).to(dtype)
+        with torch.no_grad():
+            model.embed_audio(mel_segments)
 
 
 def cli():
@@ -530,6 +878,7 @@ def cli():
     parser.add_argument("--model", default="turbo", type=valid_model_name, help="name of the Whisper model to use")
     parser.add_argument("--model_dir", type=str, default=None, help="the path to save model files; uses ~/.cache/whisper by default")
     parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu", help="device to use for PyTorch inference")
+    parser.add_argument("--quantize", type=str, default=None, choices=["int8"], help="quantize the model's Linear layers for faster inference on the CPU")
     parser.add_argument("--output_dir", "-o", type=str, default=".", help="directory to save the outputs")
     parser.add_argument("--output_format", "-f", type=str, default="all", choices=["txt", "vtt", "srt", "tsv", "json", "all"], help="format of the output file; if not specified, all available formats will be produced")
     parser.add_argument("--verbose", type=str2bool, default=True, help="whether to print out the progress and debug messages")
@@ -563,7 +912,12 @@ def cli():
     parser.add_argument("--max_words_per_line", type=optional_int, default=None, help="(requires --word_timestamps True, no effect with --max_line_width) the maximum number of words in a segment")
     parser.add_argument("--threads", type=optional_int, default=0, help="number of threads used by torch for CPU inference; supercedes MKL_NUM_THREADS/OMP_NUM_THREADS")
     parser.add_argument("--clip_timestamps", type=str, default="0", help="comma-separated list start,end,start,end,... timestamps (in seconds) of clips to process, where the last end timestamp defaults to the end of the file")
+    parser.add_argument("--vad", type=str2bool, default=False, help="detect speech with a lightweight energy-based voice activity detector and transcribe only those regions, skipping silence; replaces --clip_timestamps")
     parser.add_argument("--hallucination_silence_threshold", type=optional_float, help="(requires --word_timestamps True) skip silent periods longer than this threshold (in seconds) when a possible hallucination is detected")
+    parser.add_argument("--speculative_fallback", type=int, default=0, help="number of subsequent fallback temperatures to decode together with each attempt, trading extra compute for lower latency on windows that need to fall back")
+    parser.add_argument("--batch_size", type=optional_int, default=None, help="if greater than 1, decode this many 30-second windows of each file at once; windows are not conditioned on previous text (see --file_batch to batch across files)")
+    parser.add_argument("--workers", type=int, default=0, help="number of threads loading audio files ahead of the model and writing outputs; 0 processes the files one by one")
+    parser.add_argument("--file_batch", type=optional_int, default=None, help="encode the first 30-second windows of this many prefetched files together, which speeds up many short files (see --batch_size to batch the windows within a file)")
     # fmt: on
 
     args = parser.parse_args().__dict__
@@ -572,6 +926,7 @@ def cli():
     output_dir: str = args.pop("output_dir")
     output_format: str = args.pop("output_format")
     device: str = args.pop("device")
+    quantize: Optional[str] = args.pop("quantize")
     os.makedirs(output_dir, exist_ok=True)
 
     if model_name.endswith(".en") and args["language"] not in {"en", "English"}:
@@ -592,7 +947,13 @@ def cli():
 
     from . import load_model
 
-    model = load_model(model_name, device=device, download_root=model_dir)
+    model = load_model(
+        model_name,
+        device=device,
+        download_root=model_dir,
+        quantize=quantize,
+        warm_up=args["word_timestamps"],
+    )
 
     writer = get_writer(output_format, output_dir)
     word_options = [
@@ -610,13 +971,80 @@ def cli():
     if args["max_words_per_line"] and args["max_line_width"]:
         warnings.warn("--max_words_per_line has no effect with --max_line_width")
     writer_args = {arg: args.pop(arg) for arg in word_options}
-    for audio_path in args.pop("audio"):
+    audio_paths: List[str] = args.pop("audio")
+    workers: int = args.pop("workers")
+    group_size: int = args.pop("file_batch") or 1
+
+    if workers == 0 and group_size == 1:
+        for audio_path in audio_paths:
+            try:
+                result = transcribe(model, audio_path, temperature=temperature, **args)
+                writer(result, audio_path, **writer_args)
+            except Exception as e:
+                traceback.print_exc()
+                print(f"Skipping {audio_path} due to {type(e).__name__}: {str(e)}")
+        return
+
+    def write(result: dict, audio_path: str):
         try:
-            result = transcribe(model, audio_path, temperature=temperature, **args)
             writer(result, audio_path, **writer_args)
         except Exception as e:
             traceback.print_exc()
-            print(f"Skipping {audio_path} due to {type(e).__name__}: {str(e)}")
+            print(f"Failed to write {audio_path} due to {type(e).__name__}: {str(e)}")
+
+    if group_size > 1:
+        from .model import AudioFeaturesCache
+
+        model.audio_features_cache = AudioFeaturesCache(maxsize=2 * group_size)
+        dtype = torch.float16 if args["fp16"] else torch.float32
+        if model.device == torch.device("cpu"):
+            dtype = torch.float32
+
+    with ThreadPoolExecutor(max(workers, 1)) as loader, ThreadPoolExecutor(1) as output:
+        # keep the loader busy while the model works on the current group of files
+        paths: Iterator[str] = iter(audio_paths)
+        prefetched: Deque[Tuple[str, Future]] = deque()
+
+        def prefetch():
+            while len(prefetched) < group_size + max(workers, 1):
+                if (audio_path := next(paths, None)) is None:
+                    break
+                prefetched.append((audio_path, loader.submit(load_audio, audio_path)))
+
+        prefetch()
+        while prefetched:
+            group = [
+                prefetched.popleft() for _ in range(min(group_size, len(prefetched)))
+            ]
+            prefetch()
+
+            audios = []
+            for audio_path, future in group:
+                try:
+                    audios.append((audio_path, future.result()))
+                except Exception as e:
+                    traceback.print_exc()
+                    print(f"Skipping {audio_path} due to {type(e).__name__}: {str(e)}")
+
+            if group_size > 1:
+                try:
+                    encode_first_windows(
+                        model,
+                        [audio for _, audio in audios],
+                        dtype,
+                        detect_language=args["language"] is None
+                        and model.is_multilingual,
+                    )
+                except Exception:
+                    traceback.print_exc()
+
+            for audio_path, audio in audios:
+                try:
+                    result = transcribe(model, audio, temperature=temperature, **args)
+                    output.submit(write, result, audio_path)
+                except Exception as e:
+                    traceback.print_exc()
+                    print(f"Skipping {audio_path} due to {type(e).__name__}: {str(e)}")
 
 
 if __name__ == "__main__":
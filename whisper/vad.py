@@ -0,0 +1,109 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from .audio import HOP_LENGTH, SAMPLE_RATE
+
+
+def frame_energy(audio: np.ndarray, frame_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Compute the energy of consecutive, non-overlapping frames of the waveform, in dBFS
+
+    Parameters
+    ----------
+    audio: np.ndarray, shape = (*)
+        The mono waveform at 16 kHz, with values in [-1, 1]
+
+    frame_length: int
+        The number of samples per frame; by default one Mel spectrogram frame (10ms)
+
+    Returns
+    -------
+    np.ndarray, shape = (n_frames,)
+        The mean square of each frame in decibels; a trailing partial frame is included
+    """
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    n_frames = -(-len(audio) // frame_length)
+    frames = np.zeros(n_frames * frame_length, dtype=np.float32)
+    frames[: len(audio)] = audio
+    frames = frames.reshape(n_frames, frame_length)
+    power = np.einsum("ij,ij->i", frames, frames) / frame_length
+    return 10 * np.log10(power + 1e-10)
+
+
+def speech_regions(
+    audio: np.ndarray,
+    *,
+    threshold: float = 12.0,
+    min_threshold: float = -55.0,
+    min_speech_duration: float = 0.25,
+    min_silence_duration: float = 1.0,
+    speech_pad: float = 0.4,
+) -> List[Tuple[float, float]]:
+    """
+    Find the regions of the waveform that may contain speech, based on the frame energy relative
+    to the background noise level, which is estimated from the quietest frames
+
+    Parameters
+    ----------
+    audio: np.ndarray, shape = (*)
+        The mono waveform at 16 kHz, with values in [-1, 1]
+
+    threshold: float
+        How many decibels above the noise level a frame must be to count as speech
+
+    min_threshold: float
+        The lowest energy in dBFS that counts as speech, for recordings with a digitally silent
+        background
+
+    min_speech_duration: float
+        Regions shorter than this many seconds are dropped as clicks or noise bursts
+
+    min_silence_duration: float
+        Gaps shorter than this many seconds are merged into the surrounding speech
+
+    speech_pad: float
+        Seconds of audio added at both ends of each region, so that soft onsets and trailing
+        sounds are kept
+
+    Returns
+    -------
+    List[Tuple[float, float]]
+        The (start, end) times of the speech regions in seconds, sorted and non-overlapping
+    """
+    energy = frame_energy(audio)
+    if len(energy) == 0:
+        return []
+
+    frames_per_second = SAMPLE_RATE / HOP_LENGTH
+    noise_level = np.percentile(energy, 10)
+    is_speech = energy > max(noise_level + threshold, min_threshold)
+
+    # the frame indices where runs of speech frames start and end
+    edges = np.diff(is_speech.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # merge the runs separated by short gaps, then drop the ones that are still too short
+    if len(starts) > 1:
+        gaps = starts[1:] - ends[:-1]
+        keep = np.concatenate(
+            [[True], gaps >= min_silence_duration * frames_per_second]
+        )
+        starts = starts[keep]
+        ends = ends[np.concatenate([keep[1:], [True]])]
+    long_enough = ends - starts >= min_speech_duration * frames_per_second
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    duration = len(audio) / SAMPLE_RATE
+    starts = np.maximum(starts / frames_per_second - speech_pad, 0.0).round(2)
+    ends = np.minimum(ends / frames_per_second + speech_pad, duration).round(2)
+
+    # padding may make neighboring regions overlap
+    regions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
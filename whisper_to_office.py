@@ -16,20 +16,41 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def transcribe_for_word(audio_file, model_name="base", output_file=None):
+def run_transcription(audio_file, model_name="base", server=None):
     """
-    Transcribe audio and format as a Word-ready document
+    Transcribe audio with a freshly loaded model, or with the warm model of a
+    running `python -m whisper serve` if a server address is given
 
     Args:
         audio_file: Path to audio file
         model_name: Whisper model to use
-        output_file: Output file path (optional)
+        server: "host:port" or Unix socket path of the server (optional)
     """
+    if server is not None:
+        from whisper.server import request_transcription
+
+        print(f"Transcribing {audio_file} on {server}...")
+        messages = request_transcription(server, os.path.abspath(audio_file), model_name)
+        return list(messages)[-1]["result"]
+
     print(f"Loading {model_name} model...")
     model = whisper.load_model(model_name)
 
     print(f"Transcribing {audio_file}...")
-    result = model.transcribe(audio_file)
+    return model.transcribe(audio_file)
+
+
+def transcribe_for_word(audio_file, model_name="base", output_file=None, server=None):
+    """
+    Transcribe audio and format as a Word-ready document
+
+    Args:
+        audio_file: Path to audio file
+        model_name: Whisper model to use
+        output_file: Output file path (optional)
+        server: Address of a running `python -m whisper serve` (optional)
+    """
+    result = run_transcription(audio_file, model_name, server)
 
     # Generate output filename if not provided
     if output_file is None:
@@ -83,16 +104,12 @@ def transcribe_for_word(audio_file, model_name="base", output_file=None):
         return None
 
 
-def transcribe_for_powerpoint(audio_file, model_name="base", output_file=None):
+def transcribe_for_powerpoint(audio_file, model_name="base", output_file=None, server=None):
     """
     Transcribe audio and format as PowerPoint speaker notes
     Creates one slide worth of content per segment
     """
-    print(f"Loading {model_name} model...")
-    model = whisper.load_model(model_name)
-
-    print(f"Transcribing {audio_file}...")
-    result = model.transcribe(audio_file)
+    result = run_transcription(audio_file, model_name, server)
 
     # Generate output filename if not provided
     if output_file is None:
@@ -143,15 +160,11 @@ def transcribe_for_powerpoint(audio_file, model_name="base", output_file=None):
         return None
 
 
-def transcribe_meeting_minutes(audio_file, model_name="base", output_file=None):
+def transcribe_meeting_minutes(audio_file, model_name="base", output_file=None, server=None):
     """
     Transcribe and format as meeting minutes
     """
-    print(f"Loading {model_name} model...")
-    model = whisper.load_model(model_name)
-
-    print(f"Transcribing {audio_file}...")
-    result = model.transcribe(audio_file)
+    result = run_transcription(audio_file, model_name, server)
 
     if output_file is None:
         base_name = os.path.splitext(os.path.basename(audio_file))[0]
@@ -242,6 +255,11 @@ def main():
         "--output",
         help="Output file path (optional)"
     )
+    parser.add_argument(
+        "--server",
+        help="Address of a running 'python -m whisper serve' to use instead "
+             "of loading the model (host:port or Unix socket path)"
+    )
 
     args = parser.parse_args()
 
@@ -252,11 +270,11 @@ def main():
 
     # Transcribe based on format
     if args.format == "word":
-        transcribe_for_word(args.audio_file, args.model, args.output)
+        transcribe_for_word(args.audio_file, args.model, args.output, args.server)
     elif args.format == "powerpoint":
-        transcribe_for_powerpoint(args.audio_file, args.model, args.output)
+        transcribe_for_powerpoint(args.audio_file, args.model, args.output, args.server)
     elif args.format == "meeting":
-        transcribe_meeting_minutes(args.audio_file, args.model, args.output)
+        transcribe_meeting_minutes(args.audio_file, args.model, args.output, args.server)
 
 
 if __name__ == "__main__":